@@ -1,425 +1,178 @@
 import pygame
 import sys
-import math
-import random
+import time
+import argparse
 from pygame.locals import *
 
-# Инициализация Pygame
-pygame.init()
+import walker
+from walker import *
 
-# Настройки экрана
-info = pygame.display.Info()
-WIDTH, HEIGHT = info.current_w, info.current_h
-screen = pygame.display.set_mode((WIDTH, HEIGHT), FULLSCREEN)
-pygame.display.set_caption("Эволюция ходьбы")
+# Темп симуляции на экране
+SIM_RATE = SIM_DT * 60  # Секунд симуляции за секунду времени при 1x (как было при 60 FPS)
+FRAME_BUDGET = 1 / 60  # Сколько времени кадра можно отдать шагам симуляции
+TURBO = 0  # Особая скорость: целые поколения без отрисовки
+SPEED_STEPS = [1, 2, 3, 10, TURBO]
+TURBO_FRAME_BUDGET = 0.25  # В турбо экран обновляется не чаще, чем раз в столько секунд
+REPLAY_TURBO = 30  # Скорость повтора на «турбо»: там нечего пропускать, просто быстрее
 
-# Цвета
-WHITE = (255, 255, 255)
-BLACK = (0, 0, 0)
-RED = (255, 50, 50)
-BLUE = (50, 50, 255)
-GREEN = (50, 255, 50)
-YELLOW = (255, 255, 50)
-ORANGE = (255, 150, 50)
-PURPLE = (150, 50, 255)
-BROWN = (120, 70, 30)
-GRAY = (150, 150, 150)
-
-# Масштабирование
-SCALE = min(WIDTH, HEIGHT) / 800
+# Экран открывается только для показа (init_display): headless-запуску он не нужен
+screen = None
 FONT_SIZE = int(28 * SCALE)
-POINT_RADIUS = int(10 * SCALE)
 LINE_WIDTH = int(4 * SCALE)
 
-# Физика
-GRAVITY = 0.5 * SCALE
-FRICTION = 0.99
-MUSCLE_STRENGTH = 0.5
-STIFFNESS = 0.4
-MIN_MUSCLE_LENGTH = 40 * SCALE
-MAX_MUSCLE_LENGTH = 180 * SCALE
+def init_display():
+    # Мир получает размеры экрана; константы модели пересчитываются через configure
+    global screen, WIDTH, HEIGHT, SCALE, POINT_RADIUS, GROUND_Y, FONT_SIZE, LINE_WIDTH
+    pygame.init()
+    info = pygame.display.Info()
+    configure(Config(info.current_w, info.current_h))
+    WIDTH, HEIGHT = walker.WIDTH, walker.HEIGHT
+    SCALE = walker.SCALE
+    POINT_RADIUS = walker.POINT_RADIUS
+    GROUND_Y = walker.GROUND_Y
+    FONT_SIZE = int(28 * SCALE)
+    LINE_WIDTH = int(4 * SCALE)
+    screen = pygame.display.set_mode((WIDTH, HEIGHT), FULLSCREEN)
+    pygame.display.set_caption("Эволюция ходьбы")
 
-class Point:
-    def __init__(self, x, y, fixed=False, color=YELLOW):
-        self.x = x
-        self.y = y
-        self.prev_x = x
-        self.prev_y = y
-        self.fixed = fixed
-        self.radius = POINT_RADIUS
-        self.mass = 1.0
-        self.color = RED if fixed else color
-        self.highlight = False
-        self.id = id(self)  # Уникальный идентификатор на основе id объекта
-        
-    def __hash__(self):
-        return self.id  # Делаем объект хешируемым
-        
-    def __eq__(self, other):
-        return self.id == other.id
-        
-    def update(self, dt):
-        if not self.fixed:
-            temp_x, temp_y = self.x, self.y
-            vel_x = (self.x - self.prev_x) * FRICTION
-            vel_y = (self.y - self.prev_y) * FRICTION
-            
-            self.x += vel_x
-            self.y += vel_y + GRAVITY * dt * 50
-            
-            self.prev_x, self.prev_y = temp_x, temp_y
-            
-            self.x = max(self.radius, min(WIDTH-self.radius, self.x))
-            self.y = max(self.radius, min(HEIGHT-self.radius, self.y))
+class RenderCache:
+    # Всё, что не меняется от кадра к кадру, рисуется один раз: фон, полоса травы,
+    # шрифты, панель и кнопки. Текст перерисовывается, только когда меняется строка
+    def __init__(self):
+        self.font = pygame.font.SysFont(None, FONT_SIZE)
+        self.small_font = pygame.font.SysFont(None, int(FONT_SIZE*0.8))
+        
+        ground_height = GROUND_Y
+        self.background = pygame.Surface((WIDTH, HEIGHT)).convert()
+        self.background.fill(WHITE)
+        pygame.draw.rect(self.background, (240, 240, 255), (0, 0, WIDTH, ground_height))
+        pygame.draw.rect(self.background, BROWN, (0, ground_height, WIDTH, HEIGHT-ground_height))
+        
+        # Трава (период 25) и кромка (период 50) — одна полоса, которую сдвигаем на offset % 50
+        self.strip_top = ground_height - 15
+        self.strip = pygame.Surface((WIDTH+200, 25), pygame.SRCALPHA).convert_alpha()
+        for x in range(0, WIDTH+200, 25):
+            pygame.draw.line(self.strip, GREEN, (x, 15), (x - 12, 0), 3)
+        pygame.draw.ellipse(self.strip, GRAY, (0, 5, WIDTH+200, 20))
+        
+        self.panel = pygame.Surface((WIDTH, 100), pygame.SRCALPHA).convert_alpha()
+        self.panel.fill((150, 150, 150, 150))
+        
+        self.texts = {}
+        self.buttons = {}
+        
+    def text(self, font, text):
+        key = (id(font), text)
+        surface = self.texts.get(key)
+        if surface is None:
+            if len(self.texts) > 256:
+                self.texts.clear()
+            surface = self.texts[key] = font.render(text, True, WHITE)
+        return surface
+        
+    def button(self, rect, color, label):
+        key = (color, label)
+        surface = self.buttons.get(key)
+        if surface is None:
+            surface = pygame.Surface(rect.size, pygame.SRCALPHA).convert_alpha()
+            pygame.draw.rect(surface, color, (0, 0, rect.w, rect.h), border_radius=10)
+            text = self.small_font.render(label, True, WHITE)
+            surface.blit(text, (rect.w//2 - text.get_width()//2, rect.h//2 - text.get_height()//2))
+            self.buttons[key] = surface
+        return surface
 
-class Muscle:
-    def __init__(self, point1, point2, strength_mult=1.0):
-        self.point1 = point1
-        self.point2 = point2
-        self.rest_length = self.get_length()
-        self.target_length = self.rest_length
-        self.contracting = False
-        self.base_strength = MUSCLE_STRENGTH * strength_mult
-        self.strength = self.base_strength
-        self.phase = random.random() * 2 * math.pi
-        self.speed = random.uniform(0.5, 1.5)
-        self.color = BLUE
-        self.highlight = False
-        
-    def get_length(self):
-        dx = self.point2.x - self.point1.x
-        dy = self.point2.y - self.point1.y
-        return math.sqrt(dx*dx + dy*dy)
-        
-    def update(self, dt):
-        if self.contracting:
-            self.target_length = max(MIN_MUSCLE_LENGTH, self.rest_length * (0.6 + 0.1*math.sin(self.phase)))
-        else:
-            self.target_length = min(MAX_MUSCLE_LENGTH, self.rest_length * (1.0 + 0.2*math.sin(self.phase*0.5)))
-            
-        self.phase += dt * self.speed
-        
-        current_length = self.get_length()
-        if current_length == 0:
-            return
-            
-        dx = self.point2.x - self.point1.x
-        dy = self.point2.y - self.point1.y
-        direction_x = dx / current_length
-        direction_y = dy / current_length
-        
-        force = (current_length - self.target_length) * self.strength
-        
-        if not self.point1.fixed:
-            self.point1.x += direction_x * force * dt * 50 / self.point1.mass
-            self.point1.y += direction_y * force * dt * 50 / self.point1.mass
-            
-        if not self.point2.fixed:
-            self.point2.x -= direction_x * force * dt * 50 / self.point2.mass
-            self.point2.y -= direction_y * force * dt * 50 / self.point2.mass
-            
-        stiffness_force = (current_length - self.rest_length) * STIFFNESS
-        
-        if not self.point1.fixed:
-            self.point1.x += direction_x * stiffness_force * dt * 30
-            self.point1.y += direction_y * stiffness_force * dt * 30
-            
-        if not self.point2.fixed:
-            self.point2.x -= direction_x * stiffness_force * dt * 30
-            self.point2.y -= direction_y * stiffness_force * dt * 30
-            
-        if self.contracting:
-            self.color = GREEN
-        else:
-            ratio = current_length / self.rest_length
-            self.color = ORANGE if ratio > 1.2 else PURPLE if ratio < 0.8 else BLUE
+render_cache = None
 
-class Creature:
-    def __init__(self, points, muscles):
-        self.points = points
-        self.muscles = muscles
-        self.position = [WIDTH//2, HEIGHT//2]
-        self.time_alive = 0
-        self.distance_traveled = 0
-        self.fitness = 0
-        self.energy = 100
-        self.age = 0
-        self.color = (
-            random.randint(100, 255),
-            random.randint(100, 255),
-            random.randint(100, 255)
-        )
-        self.brain = self.Brain(len(muscles))
-        
-    class Brain:
-        def __init__(self, num_muscles):
-            self.num_muscles = num_muscles
-            self.commands = []
-            self.current_command = 0
-            self.command_timer = 0
-            self.generate_commands()
-            
-        def generate_commands(self):
-            patterns = [
-                [True, False, True, False],
-                [False, True, False, True],
-                [True, True, False, False],
-                [False, False, True, True],
-                [True, False, False, True]
-            ]
-            
-            for _ in range(15):
-                pattern = random.choice(patterns)
-                repeats = random.randint(2, 5)
-                
-                for _ in range(repeats):
-                    self.commands.append({
-                        'muscle_actions': [random.random() < 0.7 or p for p in pattern],
-                        'duration': random.randint(8, 25)
-                    })
-        
-        def update(self, creature, dt):
-            if self.current_command >= len(self.commands):
-                self.current_command = 0
-                
-            command = self.commands[self.current_command]
-            
-            for i, muscle in enumerate(creature.muscles):
-                if random.random() < 0.05:
-                    muscle.contracting = not muscle.contracting
-                else:
-                    muscle.contracting = command['muscle_actions'][i % len(command['muscle_actions'])]
-            
-            self.command_timer += dt * 60
-            if self.command_timer >= command['duration']:
-                self.current_command = (self.current_command + 1) % len(self.commands)
-                self.command_timer = 0
-        
-        def mutate(self):
-            for cmd in self.commands:
-                if random.random() < 0.1:
-                    idx = random.randint(0, len(cmd['muscle_actions'])-1)
-                    cmd['muscle_actions'][idx] = not cmd['muscle_actions'][idx]
-                    
-                if random.random() < 0.05:
-                    cmd['duration'] = max(5, cmd['duration'] + random.randint(-3, 3))
-            
-            if random.random() < 0.2:
-                self.generate_commands()
+def get_render_cache():
+    global render_cache
+    if render_cache is None:
+        render_cache = RenderCache()
+    return render_cache
+
+def draw_ground(offset):
+    # Фон целиком закрывает экран, поэтому отдельная заливка не нужна
+    cache = get_render_cache()
+    screen.blit(cache.background, (0, 0))
+    screen.blit(cache.strip, (-100 + offset%50, cache.strip_top))
+
+def highlight_color(color):
+    return (min(255, color[0]+100), min(255, color[1]+100), min(255, color[2]+100))
+
+class BodyRenderer:
+    # Рисует тела прямо из массивов физики: цвета мышц считаются векторно,
+    # мышцы рисуются по слоям цвета, а точки — готовыми спрайтами одним вызовом blits()
+    MUSCLE_PALETTE = [BLUE, GREEN, ORANGE, PURPLE]
     
-    def update(self, dt):
-        self.time_alive += dt
-        self.age += dt * 0.01
-        
-        self.brain.update(self, dt)
-        
-        for point in self.points:
-            point.update(dt)
-            
-        for muscle in self.muscles:
-            muscle.update(dt)
-            
-        center_x = sum(p.x for p in self.points) / len(self.points)
-        center_y = sum(p.y for p in self.points) / len(self.points)
-        self.position = [center_x, center_y]
-        
-        self.distance_traveled = center_x - WIDTH//2
-        
-        movement_cost = sum(
-            abs(m.get_length() - m.rest_length) * 0.001 
-            for m in self.muscles
+    def __init__(self):
+        self.sprites = {}
+        self.rng = np.random.default_rng() if np is not None else None  # Мерцание, не трогает симуляцию
+        
+    def sprite(self, color, radius, fixed):
+        # Кружок точки (и кольцо закреплённой) с центром в (half, half)
+        key = (color, radius, fixed)
+        surface = self.sprites.get(key)
+        if surface is None:
+            half = radius + 6
+            surface = pygame.Surface((half*2, half*2), pygame.SRCALPHA).convert_alpha()
+            pygame.draw.circle(surface, color, (half, half), radius)
+            if fixed:
+                pygame.draw.circle(surface, BLACK, (half, half), radius + 4, 2)
+            self.sprites[key] = surface
+        return surface
+        
+    def draw_points(self, points, offset):
+        # points: (x, y, цвет, радиус, закреплена, подсвечена)
+        sequence = []
+        for x, y, color, radius, fixed, highlight in points:
+            if highlight:
+                color, radius = highlight_color(color), radius + 2
+            sprite = self.sprite(color, radius, fixed)
+            half = sprite.get_width() // 2
+            sequence.append((sprite, (int(x - offset) - half, int(y) - half)))
+        screen.blits(sequence, doreturn=False)
+        
+    def draw_batch(self, batch, offset):
+        # Всё поколение из PopulationArrays
+        pos = batch.pos
+        lengths = muscle_lengths(pos, batch.first, batch.second)
+        ratio = lengths / np.where(batch.rest_length > 0, batch.rest_length, 1.0)
+        palette = np.select(
+            [batch.contracting, ratio > 1.2, ratio < 0.8], [1, 2, 3], default=0
         )
-        self.energy -= movement_cost * dt
-        
-        velocity = (center_x - self.position[0]) / dt if dt > 0 else 0
-        height_penalty = abs(center_y - HEIGHT//2) * 0.2
-        energy_bonus = self.energy * 0.01
-        
-        self.fitness = (
-            self.distance_traveled * 0.2 + 
-            velocity * 3 - 
-            height_penalty + 
-            energy_bonus -
-            self.age
+        wide = batch.contracting & (self.rng.random(len(lengths)) < 0.3)
+        
+        start = pos[batch.first] - (offset, 0)
+        end = pos[batch.second] - (offset, 0)
+        # Мышцы целиком за краем экрана не рисуем
+        visible = ~(((start[:, 0] < 0) & (end[:, 0] < 0)) | ((start[:, 0] > WIDTH) & (end[:, 0] > WIDTH)))
+        for index, color in enumerate(self.MUSCLE_PALETTE):
+            for highlight in (False, True):
+                group = np.flatnonzero(visible & (palette == index) & (wide == highlight))
+                if not len(group):
+                    continue
+                width = LINE_WIDTH+2 if highlight else LINE_WIDTH
+                # Вызов на мышцу оставлен сознательно. Мышцы одного цвета — не одна
+                # ломаная, а уложить их в цепочки для pygame.draw.lines сокращает
+                # вызовы только на четверть (338 -> 253 на поколении из 64 тел),
+                # зато толстая ломаная дорисовывает стыки: кадр выходит на ~0.5 мс
+                # дольше. Время здесь уходит на закраску пикселей, а не на вызовы
+                for a, b in zip(start[group].tolist(), end[group].tolist()):
+                    pygame.draw.line(screen, color, a, b, width)
+        
+        flicker = (self.rng.random(len(pos)) < 0.05).tolist()
+        self.draw_points(
+            zip(pos[:, 0].tolist(), pos[:, 1].tolist(), batch.point_colors,
+                batch.radius.astype(int).tolist(), (~batch.movable).tolist(), flicker),
+            offset
         )
-        
-        return center_x
 
-class Evolution:
-    def __init__(self, population_size=8):
-        self.population_size = population_size
-        self.population = []
-        self.generation = 0
-        self.best_fitness = 0
-        self.best_creature = None
-        self.initialize_population()
-        
-    def initialize_population(self):
-        for _ in range(self.population_size):
-            num_points = random.randint(4, 8)
-            points = []
-            
-            center = Point(WIDTH//2, HEIGHT//2, True)
-            points.append(center)
-            
-            for i in range(1, num_points):
-                angle = random.random() * 2 * math.pi
-                dist = random.randint(30, 100) * SCALE
-                x = WIDTH//2 + math.cos(angle) * dist
-                y = HEIGHT//2 + math.sin(angle) * dist
-                color = (
-                    random.randint(50, 255),
-                    random.randint(50, 255),
-                    random.randint(50, 255)
-                )
-                points.append(Point(x, y, False, color))
-            
-            muscles = []
-            num_muscles = random.randint(num_points, num_points * 2)
-            
-            for _ in range(num_muscles):
-                p1, p2 = random.sample(points, 2)
-                dist = math.sqrt((p2.x - p1.x)**2 + (p2.y - p1.y)**2)
-                if dist < 200 * SCALE:
-                    strength_mult = random.uniform(0.7, 1.3)
-                    muscles.append(Muscle(p1, p2, strength_mult))
-            
-            self.population.append(Creature(points, muscles))
-    
-    def evolve(self):
-        self.generation += 1
-        
-        for creature in self.population:
-            if creature.fitness > self.best_fitness:
-                self.best_fitness = creature.fitness
-                self.best_creature = creature
-        
-        self.population.sort(key=lambda x: x.fitness, reverse=True)
-        
-        best_creatures = self.population[:int(self.population_size * 0.4)]
-        new_population = []
-        new_population.extend(best_creatures[:2])
-        
-        while len(new_population) < self.population_size:
-            parent1 = random.choice(best_creatures)
-            parent2 = random.choice(best_creatures)
-            
-            # Создаем копии точек для ребенка
-            child_points = []
-            point_map = {}  # Для отображения старых точек на новые
-            
-            # Копируем все точки родителей
-            all_parent_points = list({p: None for p in parent1.points + parent2.points}.keys())
-            for old_point in all_parent_points:
-                new_point = Point(old_point.x, old_point.y, old_point.fixed, old_point.color)
-                child_points.append(new_point)
-                point_map[old_point] = new_point
-            
-            # Создаем мышцы ребенка
-            child_muscles = []
-            all_parent_muscles = parent1.muscles + parent2.muscles
-            
-            for muscle in all_parent_muscles:
-                if random.random() < 0.6:  # Вероятность наследования мышцы
-                    p1 = point_map.get(muscle.point1)
-                    p2 = point_map.get(muscle.point2)
-                    
-                    if p1 and p2 and p1 != p2:
-                        # Проверяем, нет ли уже такой мышцы
-                        muscle_exists = any(
-                            (m.point1 == p1 and m.point2 == p2) or 
-                            (m.point1 == p2 and m.point2 == p1)
-                            for m in child_muscles
-                        )
-                        
-                        if not muscle_exists:
-                            strength_mult = muscle.base_strength / MUSCLE_STRENGTH
-                            child_muscles.append(Muscle(p1, p2, strength_mult))
-            
-            child = Creature(child_points, child_muscles)
-            
-            if random.random() < 0.8:
-                self.mutate_creature(child)
-            
-            new_population.append(child)
-        
-        self.population = new_population
-        return self.best_creature
-    
-    def mutate_creature(self, creature):
-        creature.brain.mutate()
-        
-        if random.random() < 0.3:
-            if random.random() < 0.5 and len(creature.points) < 10:
-                # Добавляем новую точку
-                angle = random.random() * 2 * math.pi
-                dist = random.randint(30, 100) * SCALE
-                x = WIDTH//2 + math.cos(angle) * dist
-                y = HEIGHT//2 + math.sin(angle) * dist
-                color = (
-                    random.randint(50, 255),
-                    random.randint(50, 255),
-                    random.randint(50, 255)
-                )
-                new_point = Point(x, y, False, color)
-                creature.points.append(new_point)
-                
-                # Соединяем с существующими точками
-                num_connections = random.randint(1, 3)
-                connected_points = random.sample([p for p in creature.points if p != new_point], 
-                                                min(num_connections, len(creature.points)-1))
-                for point in connected_points:
-                    creature.muscles.append(Muscle(new_point, point))
-                    
-            elif len(creature.points) > 3:
-                # Удаляем случайную точку (не фиксированную)
-                non_fixed = [p for p in creature.points if not p.fixed]
-                if non_fixed:
-                    point_to_remove = random.choice(non_fixed)
-                    creature.points.remove(point_to_remove)
-                    creature.muscles = [
-                        m for m in creature.muscles 
-                        if m.point1 != point_to_remove and m.point2 != point_to_remove
-                    ]
-        
-        if random.random() < 0.4:
-            if random.random() < 0.7 and creature.muscles:
-                # Удаляем случайную мышцу
-                creature.muscles.pop(random.randint(0, len(creature.muscles)-1))
-            
-            if random.random() < 0.7 and len(creature.points) >= 2:
-                # Добавляем новую мышцу
-                p1, p2 = random.sample(creature.points, 2)
-                dist = math.sqrt((p2.x - p1.x)**2 + (p2.y - p1.y)**2)
-                if dist < 250 * SCALE:
-                    # Проверяем, нет ли уже такой мышцы
-                    muscle_exists = any(
-                        (m.point1 == p1 and m.point2 == p2) or 
-                        (m.point1 == p2 and m.point2 == p1)
-                        for m in creature.muscles
-                    )
-                    
-                    if not muscle_exists:
-                        creature.muscles.append(Muscle(p1, p2))
-        
-        # Мутация параметров мышц
-        for muscle in creature.muscles:
-            if random.random() < 0.2:
-                muscle.base_strength *= random.uniform(0.8, 1.2)
-            if random.random() < 0.1:
-                muscle.speed *= random.uniform(0.7, 1.3)
+body_renderer = None
 
-def draw_ground(offset):
-    ground_height = HEIGHT * 0.8
-    pygame.draw.rect(screen, BROWN, (0, ground_height, WIDTH, HEIGHT-ground_height))
-    
-    for x in range(-100, WIDTH+100, 25):
-        pygame.draw.line(screen, GREEN, 
-                        (x + offset%25, ground_height),
-                        (x + offset%25 - 12, ground_height-15), 3)
-    
-    pygame.draw.ellipse(screen, GRAY, 
-                       (-100 + offset%50, ground_height-10, WIDTH+200, 20))
+def get_body_renderer():
+    global body_renderer
+    if body_renderer is None:
+        body_renderer = BodyRenderer()
+    return body_renderer
 
 def draw_creature(creature, offset):
     for muscle in creature.muscles:
@@ -429,64 +182,59 @@ def draw_creature(creature, offset):
                        (muscle.point2.x - offset, muscle.point2.y), 
                        width)
     
-    for point in creature.points:
-        color = point.color
-        if point.highlight:
-            color = (min(255, color[0]+100), min(255, color[1]+100), min(255, color[2]+100))
-        
-        pygame.draw.circle(screen, color, 
-                         (int(point.x - offset), int(point.y)), 
-                         point.radius + (2 if point.highlight else 0))
-        
-        if point.fixed:
-            pygame.draw.circle(screen, BLACK, 
-                             (int(point.x - offset), int(point.y)), 
-                             point.radius + 4, 2)
+    get_body_renderer().draw_points(
+        ((p.x, p.y, p.color, p.radius, p.fixed, p.highlight) for p in creature.points),
+        offset
+    )
 
-def draw_ui(generation, best_dist, speed, creature_fitness):
-    font = pygame.font.SysFont(None, FONT_SIZE)
-    small_font = pygame.font.SysFont(None, int(FONT_SIZE*0.8))
-    
-    s = pygame.Surface((WIDTH, 100), pygame.SRCALPHA)
-    s.fill((150, 150, 150, 150))
-    screen.blit(s, (0, 0))
+def speed_label(speed):
+    return "турбо" if speed == TURBO else f"{speed}x"
+
+def button_rects():
+    button_w = (WIDTH - 50) // 4
+    button_h = 50
+    return [
+        pygame.Rect(10 + i*(10 + button_w), HEIGHT-button_h-10, button_w, button_h)
+        for i in range(4)
+    ]
+
+BUTTON_COLORS = [(100, 100, 200), (100, 200, 100), (200, 100, 100), (200, 150, 50)]
+
+def replay_bar_rect():
+    # Полоса перемотки над кнопками; касание в любом месте мира — тоже перемотка
+    return pygame.Rect(10, HEIGHT - 80, WIDTH - 20, 10)
+
+def draw_replay_bar(tick, ticks):
+    rect = replay_bar_rect()
+    pygame.draw.rect(screen, GRAY, rect, border_radius=5)
+    done = rect.copy()
+    done.w = max(1, int(rect.w * tick / max(1, ticks - 1)))
+    pygame.draw.rect(screen, ORANGE, done, border_radius=5)
+
+def seek_tick(x, ticks):
+    rect = replay_bar_rect()
+    return min(ticks - 1, max(0, int((x - rect.x) / rect.w * ticks)))
+
+def draw_ui(generation, best_dist, speed, creature_fitness, replaying=False):
+    cache = get_render_cache()
+    screen.blit(cache.panel, (0, 0))
     
     stats = [
         f"Поколение: {generation}",
         f"Рекорд: {best_dist:.1f}",
-        f"Скорость: {speed}x",
+        f"Скорость: {speed_label(speed)}",
         f"Фитнес: {creature_fitness:.1f}"
     ]
     
     for i, text in enumerate(stats):
-        text_surface = font.render(text, True, WHITE)
-        screen.blit(text_surface, (10, 10 + i*(FONT_SIZE+5)))
-    
-    button_w = WIDTH // 4
-    button_h = 50
-    
-    pygame.draw.rect(screen, (100, 100, 200), (10, HEIGHT-button_h-10, button_w, button_h), border_radius=10)
-    pause_text = small_font.render("Пауза", True, WHITE)
-    screen.blit(pause_text, (10 + button_w//2 - pause_text.get_width()//2, HEIGHT-button_h-10 + button_h//2 - pause_text.get_height()//2))
+        screen.blit(cache.text(cache.font, text), (10, 10 + i*(FONT_SIZE+5)))
     
-    pygame.draw.rect(screen, (100, 200, 100), (20 + button_w, HEIGHT-button_h-10, button_w, button_h), border_radius=10)
-    speed_text = small_font.render(f"Скорость: {speed}x", True, WHITE)
-    screen.blit(speed_text, (20 + button_w + button_w//2 - speed_text.get_width()//2, HEIGHT-button_h-10 + button_h//2 - speed_text.get_height()//2))
-    
-    pygame.draw.rect(screen, (200, 100, 100), (30 + button_w*2, HEIGHT-button_h-10, button_w, button_h), border_radius=10)
-    reset_text = small_font.render("Сброс", True, WHITE)
-    screen.blit(reset_text, (30 + button_w*2 + button_w//2 - reset_text.get_width()//2, HEIGHT-button_h-10 + button_h//2 - reset_text.get_height()//2))
+    labels = ["Пауза", f"Скорость: {speed_label(speed)}", "Сброс", "Эволюция" if replaying else "Повтор"]
+    for rect, color, label in zip(button_rects(), BUTTON_COLORS, labels):
+        screen.blit(cache.button(rect, color, label), rect.topleft)
 
 def check_button_click(pos):
-    button_w = WIDTH // 4
-    button_h = 50
-    buttons = [
-        pygame.Rect(10, HEIGHT-button_h-10, button_w, button_h),
-        pygame.Rect(20 + button_w, HEIGHT-button_h-10, button_w, button_h),
-        pygame.Rect(30 + button_w*2, HEIGHT-button_h-10, button_w, button_h)
-    ]
-    
-    for i, button in enumerate(buttons):
+    for i, button in enumerate(button_rects()):
         if button.collidepoint(pos):
             return i
     return -1
@@ -515,26 +263,126 @@ def create_initial_creature():
     
     return Creature(points, muscles)
 
-def main():
+def run_headless(generations, engine="objects", population_size=8, workers=None, seed=None, cache=None,
+                 checkpoint=None, resume=False, dt=None, schedule=None, telemetry=None, recorder=None):
+    # Эволюция без экрана: каждое поколение считается за миллисекунды
+    if dt is None:
+        dt = PBD_DT if engine == "pbd" else SIM_DT
+    evolution = checkpoint.load(cache) if checkpoint and resume else None
+    if evolution is None:
+        evolution = Evolution(population_size, seed, cache)
+    else:
+        print(f"Продолжаем с поколения {evolution.generation}")
+    evolution.telemetry = telemetry
+    evolution.recorder = recorder
+    try:
+        for _ in range(generations):
+            ranking = evolution.evaluate(dt, engine=engine, workers=workers, schedule=schedule)
+            evolution.evolve()
+            if checkpoint:
+                checkpoint.maybe_save(evolution)
+            print(f"Поколение {evolution.generation}: лучший {ranking[0][0]:.1f}, рекорд {evolution.best_fitness:.1f}")
+    finally:
+        if recorder is not None:
+            recorder.close()
+        evolution.close()
+        if checkpoint:
+            checkpoint.save(evolution)
+            checkpoint.wait()
+        if cache is not None:
+            print(f"Кеш фитнеса: {cache.hits} попаданий, {cache.misses} промахов ({cache.hit_rate():.0%})")
+            cache.close()
+        if telemetry is not None:
+            telemetry.close()
+    return evolution
+
+def print_island_report(report):
+    index, generation, best, record = report
+    if generation is None:
+        print(f"Остров {index} закончил: рекорд {best:.1f}")
+    else:
+        print(f"Остров {index}, поколение {generation}: лучший {best:.1f}, рекорд {record:.1f}")
+
+def run_islands(count, generations, engine="objects", population_size=8, seed=None, dt=None, schedule=None,
+                every=MIGRATE_EVERY, migrants=MIGRANTS, addresses=None, island=None):
+    # Островная модель без экрана. С island запускается только этот остров кольца
+    # addresses, остальные работают на других машинах (каждая со своим --island)
+    if dt is None:
+        dt = PBD_DT if engine == "pbd" else SIM_DT
+    if island is not None:
+        if seed is None:
+            raise SystemExit("Для --island нужен общий --seed на всех машинах")
+        best = island_process(island, len(addresses), population_size, seed, generations, dt, engine,
+                              schedule, every, migrants, print_island_report, addresses=addresses)
+        return best
+    
+    best = None
+    for report in evolve_islands(count, generations, population_size, seed, dt, engine, schedule,
+                                 every, migrants, addresses):
+        print_island_report(report)
+        if report[1] is None and (best is None or report[3].fitness > best.fitness):
+            best = report[3]
+    print(f"Лучший на всех островах: {best.fitness:.1f}")
+    return best
+
+def next_generation(evolution, checkpoint):
+    # Оцениваем поколение целиком и выводим лучшего
+    evolution.evaluate()
+    best_genome = evolution.evolve()
+    checkpoint.maybe_save(evolution)
+    return best_genome
+
+def main(telemetry=None, replay_dir=REPLAY_DIR):
+    init_display()
     clock = pygame.time.Clock()
-    evolution = Evolution()
-    best_creature = create_initial_creature()
-    current_creature = best_creature
+    checkpoint = Checkpoint()
+    evolution = checkpoint.load(FitnessCache())
+    if evolution is None:
+        evolution = Evolution(cache=FitnessCache())
+    evolution.telemetry = telemetry
+    # Чемпионы поколений пишутся в фоне; смотреть их можно кнопкой «Повтор» (нужен numpy)
+    recorder = ReplayRecorder(replay_dir) if np is not None else None
+    evolution.recorder = recorder
+    
+    best_genome = evolution.best_genome
+    current_creature = best_genome.build() if best_genome else create_initial_creature()
     
     # Инициализация переменных состояния
     simulating = True
     speed_multiplier = 1
-    current_generation = 0
-    best_distance = 0
+    current_generation = evolution.generation
+    best_distance = best_genome.distance_traveled if best_genome else 0
     world_offset = 0
     last_touch_pos = None
     touch_start_time = 0
     
+    # Показ всего поколения сразу (касание верхней панели); нужен numpy
+    population_view = False
+    batch = None
+    
+    # Повтор записанного чемпиона: replay_tick дробный, кадр берётся по его целой части.
+    # Верхняя панель листает поколения, касание мира или полосы — перемотка
+    replay = None
+    replay_creature = None
+    replay_tick = 0.0
+    
+    # Симуляция идёт фиксированным шагом SIM_DT; скорость меняет только число шагов за кадр
+    accumulator = 0.0
+    last_time = time.perf_counter()
+    
     while True:
-        dt = 0.05 * speed_multiplier
+        now = time.perf_counter()
+        frame_time = min(now - last_time, 0.25)
+        last_time = now
         
         for event in pygame.event.get():
             if event.type == QUIT or (event.type == KEYDOWN and event.key == K_ESCAPE):
+                checkpoint.save(evolution)
+                checkpoint.wait()
+                if recorder is not None:
+                    recorder.close()
+                if telemetry is not None:
+                    telemetry.close()
                 pygame.quit()
                 sys.exit()
                 
@@ -544,19 +392,54 @@ def main():
                 touch_start_time = pygame.time.get_ticks()
                 
                 button_idx = check_button_click(pos)
-                if button_idx == 0:
+                if replay is not None and button_idx == -1:
+                    if pos[1] < 100:
+                        generations = recorder.generations()
+                        index = generations.index(replay.generation) if replay.generation in generations else 0
+                        index += -1 if pos[0] < WIDTH // 2 else 1
+                        replay = recorder.open(generations[index % len(generations)])
+                        replay_creature = replay.creature()
+                        replay_tick = 0.0
+                    else:
+                        replay_tick = float(seek_tick(pos[0], replay.ticks))
+                elif button_idx == 3 and recorder is not None:
+                    if replay is not None:
+                        replay = replay_creature = None
+                        world_offset = 0
+                    else:
+                        generations = recorder.generations()
+                        if generations:
+                            replay = recorder.open(generations[-1])
+                            replay_creature = replay.creature()
+                            replay_tick = 0.0
+                elif button_idx == -1 and pos[1] < 100 and np is not None:
+                    population_view = not population_view
+                    batch = None
+                    world_offset = 0
+                elif button_idx == 0:
                     simulating = not simulating
                 elif button_idx == 1:
-                    speed_multiplier = speed_multiplier % 3 + 1
+                    speed_multiplier = SPEED_STEPS[(SPEED_STEPS.index(speed_multiplier) + 1) % len(SPEED_STEPS)]
+                    accumulator = 0.0
                 elif button_idx == 2:
-                    evolution = Evolution()
-                    best_creature = create_initial_creature()
-                    current_creature = best_creature
+                    checkpoint.archive()
+                    evolution = Evolution(cache=FitnessCache(), telemetry=telemetry)
+                    if recorder is not None:
+                        recorder.clear()
+                        evolution.recorder = recorder
+                    replay = replay_creature = None
+                    current_creature = create_initial_creature()
                     current_generation = 0
                     best_distance = 0
                     world_offset = 0
+                    accumulator = 0.0
+                    batch = None
                     simulating = True
             
+            elif event.type == FINGERMOTION and replay is not None:
+                if event.y * HEIGHT >= 100 and check_button_click((event.x * WIDTH, event.y * HEIGHT)) == -1:
+                    replay_tick = float(seek_tick(event.x * WIDTH, replay.ticks))
+            
             elif event.type == FINGERMOTION and last_touch_pos:
                 if pygame.time.get_ticks() - touch_start_time > 500:
                     dx = event.x * WIDTH - last_touch_pos[0]
@@ -566,36 +449,175 @@ def main():
             elif event.type == FINGERUP:
                 last_touch_pos = None
         
-        if simulating:
-            center_x = current_creature.update(dt)
-            target_offset = WIDTH//2 - center_x
-            world_offset += (target_offset - world_offset) * 0.1 * speed_multiplier
+        generation_done = False
+        if replay is not None:
+            # Кадры уже посчитаны: скорость и перемотка ничего не стоят, эволюция ждёт
+            if simulating:
+                speed = REPLAY_TURBO if speed_multiplier == TURBO else speed_multiplier
+                replay_tick = (replay_tick + frame_time * SIM_RATE * speed / replay.dt) % replay.ticks
+            replay.apply(replay_creature, int(replay_tick))
+            world_offset = WIDTH//2 - replay_creature.position[0]
+            
+        elif simulating and speed_multiplier == TURBO:
+            # Турбо: считаем поколения, пока не выйдет время кадра, рисуем только итог
+            deadline = now + TURBO_FRAME_BUDGET
+            while True:
+                best_genome = next_generation(evolution, checkpoint)
+                best_distance = max(best_distance, best_genome.distance_traveled)
+                if time.perf_counter() > deadline:
+                    break
+            current_creature = best_genome.build()
+            current_generation = evolution.generation
+            world_offset = 0
+            batch = None
+            
+        elif simulating and population_view:
+            # Всё поколение в одних массивах, с теми же seed'ами, что и при оценке
+            if batch is None:
+                batch = PopulationArrays([g.build(evolution.evaluation_seed(g)) for g in evolution.population])
+            accumulator += frame_time * SIM_RATE * speed_multiplier
+            deadline = now + FRAME_BUDGET
+            while accumulator >= SIM_DT:
+                accumulator -= SIM_DT
+                if not batch.step(SIM_DT):
+                    best_genome = next_generation(evolution, checkpoint)
+                    current_generation = evolution.generation
+                    best_distance = max(best_distance, best_genome.distance_traveled)
+                    batch = None
+                    generation_done = True
+                    break
+                if time.perf_counter() > deadline:
+                    accumulator = 0.0
+                    break
+            
+            if generation_done:
+                world_offset = 0
+            else:
+                # Камера следит за лидером
+                target_offset = WIDTH//2 - batch.center[batch.fitness.argmax(), 0]
+                world_offset += (target_offset - world_offset) * min(1.0, 0.1 * speed_multiplier)
+            
+        elif simulating:
+            accumulator += frame_time * SIM_RATE * speed_multiplier
+            deadline = now + FRAME_BUDGET
+            while accumulator >= SIM_DT:
+                center_x = current_creature.update(SIM_DT)
+                accumulator -= SIM_DT
+                
+                if current_creature.time_alive > MAX_LIFETIME or current_creature.energy <= 0:
+                    best_genome = next_generation(evolution, checkpoint)
+                    current_creature = best_genome.build()
+                    current_generation = evolution.generation
+                    best_distance = max(best_distance, best_genome.distance_traveled)
+                    generation_done = True
+                    
+                if time.perf_counter() > deadline:
+                    # Не успеваем — отбрасываем долг, а не копим его бесконечно
+                    accumulator = 0.0
+                    break
             
-            if current_creature.time_alive > 10 or current_creature.energy <= 0:
-                best_creature = evolution.evolve()
-                current_creature = best_creature
-                current_generation = evolution.generation
-                best_distance = max(best_distance, current_creature.distance_traveled)
+            if generation_done:
                 world_offset = 0
+            else:
+                target_offset = WIDTH//2 - current_creature.position[0]
+                world_offset += (target_offset - world_offset) * min(1.0, 0.1 * speed_multiplier)
         
-        screen.fill(WHITE)
-        pygame.draw.rect(screen, (240, 240, 255), (0, 0, WIDTH, HEIGHT*0.8))
+        drawing = time.perf_counter()
         draw_ground(world_offset)
         
-        if current_creature:
+        if replay is not None:
+            draw_creature(replay_creature, world_offset)
+        elif population_view and batch is not None:
+            get_body_renderer().draw_batch(batch, world_offset)
+        elif current_creature:
             draw_creature(current_creature, world_offset)
             
             for muscle in current_creature.muscles:
-                muscle.highlight = muscle.contracting and random.random() < 0.3
+                muscle.highlight = muscle.contracting and render_random.random() < 0.3
             
             for point in current_creature.points:
-                point.highlight = random.random() < 0.05
+                point.highlight = render_random.random() < 0.05
         
-        fitness = current_creature.fitness if current_creature else 0
-        draw_ui(current_generation, best_distance, speed_multiplier, fitness)
+        if replay is not None:
+            draw_ui(replay.generation, best_distance, speed_multiplier, replay.fitness, True)
+            draw_replay_bar(int(replay_tick), replay.ticks)
+        else:
+            if population_view and batch is not None:
+                fitness = float(batch.fitness.max())
+            else:
+                fitness = current_creature.fitness if current_creature else 0
+            draw_ui(current_generation, best_distance, speed_multiplier, fitness)
         
         pygame.display.flip()
-        clock.tick(60)
+        if telemetry is not None:
+            telemetry.timings['render'] += time.perf_counter() - drawing
+        clock.tick(0 if speed_multiplier == TURBO else 60)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Эволюция ходьбы")
+    parser.add_argument("--headless", type=int, metavar="ПОКОЛЕНИЙ",
+                        help="считать эволюцию без экрана")
+    parser.add_argument("--engine", choices=["objects", "arrays", "batch", "pbd"], default="objects")
+    parser.add_argument("--dt", type=float, help=f"шаг симуляции (по умолчанию {SIM_DT}, для pbd {PBD_DT})")
+    parser.add_argument("--population", type=int, default=8)
+    parser.add_argument("--workers", type=int, help="число процессов для оценки")
+    parser.add_argument("--seed", type=int, help="seed для воспроизводимого запуска")
+    parser.add_argument("--cache", metavar="ФАЙЛ", help="файл кеша фитнеса между запусками")
+    parser.add_argument("--cache-size", type=int, default=100000)
+    parser.add_argument("--checkpoint", metavar="ФАЙЛ",
+                        help=f"сохранять прогресс в файл (на экране всегда {CHECKPOINT_PATH})")
+    parser.add_argument("--checkpoint-every", type=int, default=CHECKPOINT_EVERY,
+                        help="поколений между сохранениями, 0 — только в конце")
+    parser.add_argument("--resume", action="store_true", help="продолжить с сохранения")
+    parser.add_argument("--halving", type=float, metavar="СЕКУНД",
+                        help="оценивать гонкой (successive halving), начиная с такого горизонта")
+    parser.add_argument("--halving-keep", type=float, default=0.5, metavar="ДОЛЯ",
+                        help="доля существ, проходящих на следующую ступень")
+    parser.add_argument("--islands", type=int, metavar="N", help="островная модель: N эволюций в процессах")
+    parser.add_argument("--migrate-every", type=int, default=MIGRATE_EVERY, metavar="ПОКОЛЕНИЙ")
+    parser.add_argument("--migrants", type=int, default=MIGRANTS, help="сколько лучших геномов плывёт к соседу")
+    parser.add_argument("--island-addresses", metavar="ХОСТ:ПОРТ,...",
+                        help="связь островов по TCP, адрес на каждый остров (иначе Pipe)")
+    parser.add_argument("--island", type=int, metavar="НОМЕР",
+                        help="запустить только этот остров из --island-addresses (для нескольких машин)")
+    parser.add_argument("--size", metavar="ШxВ", help="размер мира без экрана, например 1280x800")
+    parser.add_argument("--replays", metavar="КАТАЛОГ",
+                        help=f"куда писать повторы чемпионов (на экране по умолчанию {REPLAY_DIR})")
+    parser.add_argument("--telemetry", metavar="ФАЙЛ",
+                        help="сводка по поколениям: .csv или JSON Lines (по умолчанию)")
+    args = parser.parse_args()
+    if args.telemetry and args.headless and (args.islands or args.island is not None):
+        parser.error("--telemetry пока не работает с островами")
+    if args.replays and args.headless and (args.islands or args.island is not None):
+        parser.error("--replays пока не работает с островами")
+    if args.replays and np is None:
+        parser.error("для --replays нужен numpy")
+    if args.resume and args.headless and not args.checkpoint:
+        parser.error("для --resume нужен --checkpoint")
+    telemetry = Telemetry([open_sink(args.telemetry)]) if args.telemetry else None
+    
+    if args.headless:
+        if args.size:
+            width, height = args.size.lower().split("x")
+            configure(Config(int(width), int(height)))
+        schedule = Halving(args.halving, args.halving_keep) if args.halving else None
+        if args.islands or args.island is not None:
+            addresses = None
+            if args.island_addresses:
+                addresses = [(host, int(port)) for host, port in
+                             (item.rsplit(":", 1) for item in args.island_addresses.split(","))]
+            elif args.island is not None:
+                parser.error("--island работает только вместе с --island-addresses")
+            run_islands(len(addresses) if addresses else args.islands, args.headless, args.engine,
+                        args.population, args.seed, args.dt, schedule, args.migrate_every, args.migrants,
+                        addresses, args.island)
+        else:
+            cache = FitnessCache(args.cache_size, args.cache)
+            # Без --checkpoint ничего не сохраняем: быстрые опыты не должны
+            # затирать долгий запуск с экрана
+            checkpoint = Checkpoint(args.checkpoint, args.checkpoint_every) if args.checkpoint else None
+            run_headless(args.headless, args.engine, args.population, args.workers, args.seed, cache,
+                         checkpoint, args.resume, args.dt, schedule, telemetry,
+                         ReplayRecorder(args.replays) if args.replays else None)
+    else:
+        main(telemetry, args.replays or REPLAY_DIR)
@@ -1,12 +1,75 @@
 #!/usr/bin/env python3
+# Раз в 10 минут снимает `tinyalsa-mixer -D 0 list`. По умолчанию пишет журнал
+# audio_mixer.log: один полный снимок и дальше только изменившиеся контролы
+# (см. mixer.SnapshotLog). --full — по-старому, полный дамп в отдельный файл.
+#   python auto_log.py --show "2025-11-15 20:16"  — состояние на этот момент
 import subprocess
 import time
 import os
+import sys
+import argparse
 
-while True:
-    log = subprocess.getoutput("tinyalsa-mixer -D 0 list")
-    filename = f"audio_log_{time.strftime('%H%M')}.txt"
+import mixer
+
+COMMAND = "tinyalsa-mixer -D 0 list"
+INTERVAL = 600  # 10 минут
+LOG_PATH = "audio_mixer.log"
+
+def capture():
+    # Снимок из вывода tinyalsa-mixer или None, если команда не сработала
+    output = subprocess.getoutput(COMMAND)
+    for snapshot in mixer.read_dumps(output.splitlines()):
+        return snapshot, output
+    return None, output
+
+def save_full(output):
+    # Дата в имени, чтобы файлы не перезаписывали друг друга на следующий день
+    filename = f"audio_log_{time.strftime('%Y%m%d_%H%M')}.txt"
     with open(filename, "w") as f:
-        f.write(f"# {time.strftime('%Y-%m-%d %H:%M')}\n{log}")
+        f.write(f"# {time.strftime('%Y-%m-%d %H:%M')}\n{output}")
     print(f"Лог сохранён: {filename}")
-    time.sleep(600)  # 10 минут
\ No newline at end of file
+
+def save_delta(log, snapshot, output):
+    if snapshot is None:
+        print(f"Нет таблицы контролов: {output.strip()[:200]}")
+        return
+    kind = log.append(snapshot)
+    stamp = time.strftime("%H:%M")
+    if kind is None:
+        print(f"{stamp}: без изменений")
+    elif kind == mixer.BASELINE:
+        print(f"{stamp}: полный снимок, {len(snapshot.controls)} контролов ({os.path.getsize(log.path)} байт)")
+    else:
+        print(f"{stamp}: изменения записаны ({os.path.getsize(log.path)} байт)")
+
+def show(path, moment):
+    when = time.mktime(time.strptime(moment, "%Y-%m-%d %H:%M"))
+    snapshot = mixer.SnapshotLog(path).state_at(when)
+    if snapshot is None:
+        sys.exit(f"В {path} нет снимков до {moment}")
+    print(f"# {snapshot.time}")
+    mixer.write_table(snapshot)
+
+def main():
+    parser = argparse.ArgumentParser(description="Периодические снимки mixer controls")
+    parser.add_argument("--full", action="store_true", help="полный дамп в отдельный файл каждый раз")
+    parser.add_argument("--log", default=LOG_PATH, metavar="ФАЙЛ", help="журнал снимков")
+    parser.add_argument("--interval", type=float, default=INTERVAL, metavar="СЕКУНД")
+    parser.add_argument("--show", metavar="ГГГГ-ММ-ДД ЧЧ:ММ", help="восстановить состояние на момент и выйти")
+    args = parser.parse_args()
+
+    if args.show:
+        show(args.log, args.show)
+        return
+
+    log = None if args.full else mixer.SnapshotLog(args.log)
+    while True:
+        snapshot, output = capture()
+        if log is None:
+            save_full(output)
+        else:
+            save_delta(log, snapshot, output)
+        time.sleep(args.interval)
+
+if __name__ == "__main__":
+    main()
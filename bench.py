@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# Замеры скорости симуляции и эволюции (модель walker.py, без экрана).
+# Результаты пишутся в JSON, чтобы сравнивать их между коммитами:
+#   python bench.py --out before.json
+#   python bench.py --out after.json --compare before.json
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import platform
+import subprocess
+import tracemalloc
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+POINT_COUNTS = [4, 6, 8, 10]  # Сложность существа: точек, мышц до 2x (как в Genome.create)
+POPULATION_SIZES = [8, 32, 128]
+ENGINES = ["objects", "arrays", "batch", "pbd"]
+TICKS = 200  # Тиков на замер скорости одного существа
+ALLOC_TICKS = 50  # Тиков под tracemalloc (он сильно замедляет)
+GENERATIONS = 3
+REPEATS = 3  # Берём лучший из повторов: он меньше всего зашумлён
+
+def make_genome(w, num_points, rng):
+    # Существо заданной сложности: num_points точек и до 2x мышц
+    genome = w.Genome()
+    genome.add_point(w.WIDTH//2, w.HEIGHT//2, True)
+    for _ in range(1, num_points):
+        angle = rng.random() * 2 * math.pi
+        dist = rng.randint(30, 100) * w.SCALE
+        genome.add_point(w.WIDTH//2 + math.cos(angle) * dist, w.HEIGHT//2 + math.sin(angle) * dist)
+
+    pairs = [(a, b) for a in range(num_points) for b in range(a + 1, num_points)]
+    rng.shuffle(pairs)
+    for a, b in pairs[:num_points * 2]:
+        genome.add_muscle(a, b, rng.uniform(0.7, 1.3), rng=rng)
+    genome.add_commands(w.random_commands(rng))
+    return genome
+
+def best_of(run, repeats=REPEATS):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def bench_ticks(w, engine, num_points, ticks=TICKS, seed=1):
+    # Тиков в секунду на одно существо. Для batch и pbd — сумма по поколению из 32 существ
+    rng = random.Random(seed)
+    count = 32 if engine in ("batch", "pbd") else 1
+    genomes = [make_genome(w, num_points, rng) for _ in range(count)]
+
+    def make():
+        creatures = [g.build(seed + i) for i, g in enumerate(genomes)]
+        if engine == "objects":
+            return creatures[0].update
+        if engine == "arrays":
+            return w.ArrayCreature(creatures[0]).update
+        return w.PopulationArrays(creatures, w.solver_of(engine)).update
+
+    def run():
+        update = make()
+        for _ in range(ticks):
+            update(w.SIM_DT)
+
+    elapsed = best_of(run)
+    return {
+        "case": "ticks", "engine": engine, "points": num_points,
+        "muscles": genomes[0].num_muscles, "creatures": count,
+        "ticks_per_sec": ticks * count / elapsed,
+        "us_per_tick": elapsed / (ticks * count) * 1e6,
+    }
+
+def bench_muscles(w, num_points, ticks=TICKS, seed=1):
+    # Только Muscle.update, без Point.update и мозга
+    genome = make_genome(w, num_points, random.Random(seed))
+    creature = genome.build(seed)
+    muscles = creature.muscles
+
+    def run():
+        for _ in range(ticks):
+            for muscle in muscles:
+                muscle.update(w.SIM_DT)
+
+    elapsed = best_of(run)
+    return {
+        "case": "muscle_update", "engine": "objects", "points": num_points,
+        "muscles": len(muscles),
+        "updates_per_sec": ticks * len(muscles) / elapsed,
+        "us_per_update": elapsed / (ticks * len(muscles)) * 1e6,
+    }
+
+def bench_allocations(w, engine, num_points, ticks=ALLOC_TICKS, seed=1):
+    # Сколько памяти выделяется за тик: пик сверх исходного уровня и то, что осталось
+    genome = make_genome(w, num_points, random.Random(seed))
+    creature = genome.build(seed)
+    if engine == "objects":
+        update = creature.update
+    elif engine == "arrays":
+        update = w.ArrayCreature(creature).update
+    else:
+        update = w.PopulationArrays([creature], w.solver_of(engine)).update
+    update(w.SIM_DT)  # Первый тик создаёт кеши, его не считаем
+
+    tracemalloc.start()
+    try:
+        transient = 0
+        before, _ = tracemalloc.get_traced_memory()
+        for _ in range(ticks):
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            update(w.SIM_DT)
+            _, peak = tracemalloc.get_traced_memory()
+            transient += peak - current
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "case": "allocations", "engine": engine, "points": num_points,
+        "muscles": genome.num_muscles,
+        "bytes_per_tick": transient / ticks,
+        "retained_bytes_per_tick": (after - before) / ticks,
+    }
+
+def bench_generations(w, engine, population_size, generations=GENERATIONS, seed=1):
+    # Поколений в секунду: полная оценка + отбор/мутации, без кеша и процессов
+    dt = w.PBD_DT if engine == "pbd" else w.SIM_DT
+
+    def run():
+        evolution = w.Evolution(population_size, seed)
+        for _ in range(generations):
+            evolution.evaluate(dt, engine=engine)
+            evolution.evolve()
+
+    elapsed = best_of(run, 1)
+
+    # Отдельно шаг отбора и мутаций — он не зависит от движка
+    evolution = w.Evolution(population_size, seed)
+    evolution.evaluate(dt, engine=engine)
+    state = evolution.state()
+
+    def evolve():
+        w.Evolution.from_state(state).evolve()
+
+    evolve_time = best_of(evolve)
+    return {
+        "case": "generations", "engine": engine, "population": population_size,
+        "gens_per_sec": generations / elapsed,
+        "creatures_per_sec": generations * population_size / elapsed,
+        "evolve_ms": evolve_time * 1000,
+    }
+
+def git_commit():
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                                capture_output=True, text=True, check=False)
+        return result.stdout.strip() or None
+    except OSError:
+        return None
+
+def case_key(result):
+    # По этим полям сравниваем один и тот же замер в разных файлах
+    return tuple(result.get(name) for name in ("case", "engine", "points", "population"))
+
+METRICS = ["ticks_per_sec", "updates_per_sec", "gens_per_sec", "bytes_per_tick"]
+
+def compare(results, baseline):
+    old = {case_key(r): r for r in baseline["results"]}
+    print(f"\nСравнение с {baseline.get('commit')}:", file=sys.stderr)
+    for result in results:
+        previous = old.get(case_key(result))
+        if previous is None:
+            continue
+        for metric in METRICS:
+            if metric in result and previous.get(metric):
+                ratio = result[metric] / previous[metric]
+                label = " ".join(str(v) for v in case_key(result) if v is not None)
+                print(f"  {label:32} {metric:16} {previous[metric]:12.1f} -> {result[metric]:12.1f}  x{ratio:.2f}", file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description="Замеры скорости симуляции")
+    parser.add_argument("--out", metavar="ФАЙЛ", help="куда записать JSON (по умолчанию stdout)")
+    parser.add_argument("--compare", metavar="ФАЙЛ", help="JSON прошлого запуска для сравнения")
+    parser.add_argument("--quick", action="store_true", help="меньше случаев, для быстрой проверки")
+    args = parser.parse_args()
+
+    # Модель не трогает pygame и экран, поэтому замеряем и время её импорта
+    started = time.perf_counter()
+    import walker as w
+    import_time = time.perf_counter() - started
+
+    engines = ENGINES if w.np is not None else ["objects"]
+    point_counts = [4, 10] if args.quick else POINT_COUNTS
+    population_sizes = [8] if args.quick else POPULATION_SIZES
+
+    results = []
+    for engine in engines:
+        for num_points in point_counts:
+            results.append(bench_ticks(w, engine, num_points))
+            results.append(bench_allocations(w, engine, num_points))
+    for num_points in point_counts:
+        results.append(bench_muscles(w, num_points))
+    for engine in engines:
+        for population_size in population_sizes:
+            results.append(bench_generations(w, engine, population_size))
+
+    report = {
+        "commit": git_commit(),
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": w.np.__version__ if w.np is not None else None,
+        "machine": platform.machine(),
+        "import_sec": import_time,
+        "results": results,
+    }
+    text = json.dumps(report, indent=1, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+        print(f"Результаты записаны в {args.out}", file=sys.stderr)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+# Захват изменений mixer controls между снимками auto_log.py. Один полный снимок
+# при старте, дальше раз в POLL_INTERVAL по id читаются только отслеживаемые
+# контролы, а поток событий (alsactl monitor или свой файл/FIFO) даёт изменения сразу.
+# Изменения копятся в кольцевом буфере со временем в наносекундах и пачками
+# уходят в тот же журнал, что пишет auto_log.py (mixer.SnapshotLog):
+#   python capture.py --watch '*_scenario' '*_irq_cnt' --events-command 'alsactl monitor'
+#   python capture.py --table state.txt --events-file events.fifo   — без устройства
+import os
+import re
+import sys
+import time
+import stat
+import shlex
+import signal
+import asyncio
+import argparse
+import fnmatch
+from array import array
+
+import mixer
+
+COMMAND = ["tinyalsa-mixer", "-D", "0"]
+WATCH = ["*_scenario", "*_irq_cnt", "Audio IRQ* CNT"]
+POLL_INTERVAL = 0.25  # Секунд между опросами отслеживаемых контролов (по `get` на контрол)
+GET_MARKER = "--capture-get--"  # Конец ответа на один `get` в выводе shell
+RING_SIZE = 4096  # Изменений в буфере; при переполнении теряются самые старые
+FLUSH_INTERVAL = 1.0  # Секунд между записями в журнал
+FLUSH_BATCH = 512  # Столько изменений — и пишем, не дожидаясь FLUSH_INTERVAL
+BASELINE_EVERY = 10000  # Изменения идут часто: полный снимок реже, чем у auto_log.py
+
+# Строки потока событий: «node hw:0, #12 (2,0,0,Имя,0) VALUE» как у alsactl monitor —
+# контрол надо перечитать; «12 On» — id tinymix и сразу новое значение.
+# У alsactl #N — numid ALSA, он с единицы, а id tinymix — номер с нуля
+MONITOR_RE = re.compile(r".*#(\d+)\b(?: \(\d+,\d+,\d+,(.*),\d+\))?")
+EVENT_RE = re.compile(r"(\d+)(?:\s+(.*))?$")
+
+def parse_event(line, names):
+    # (id контрола, значение или None — перечитать) или None, если строка не событие.
+    # names — {имя: id}: по имени из alsactl, а без него numid - 1
+    line = line.strip()
+    match = EVENT_RE.match(line)
+    if match:
+        return int(match.group(1)), match.group(2) or None
+    match = MONITOR_RE.match(line)
+    if match is None:
+        return None
+    control_id = names.get(match.group(2)) if match.group(2) else None
+    return (int(match.group(1)) - 1 if control_id is None else control_id), None
+
+class RingBuffer:
+    # Изменения (время в нс, id, значение) в заранее выделенных массивах
+    def __init__(self, capacity=RING_SIZE):
+        self.capacity = capacity
+        self.times = array('q', [0]) * capacity
+        self.ids = array('i', [0]) * capacity
+        self.values = [None] * capacity
+        self.start = 0
+        self.size = 0
+        self.dropped = 0  # Сколько потеряно из-за переполнения
+
+    def __len__(self):
+        return self.size
+
+    def push(self, when, control_id, value):
+        if self.size == self.capacity:
+            self.start = (self.start + 1) % self.capacity
+            self.size -= 1
+            self.dropped += 1
+        index = (self.start + self.size) % self.capacity
+        self.times[index] = when
+        self.ids[index] = control_id
+        self.values[index] = value
+        self.size += 1
+
+    def drain(self):
+        # Всё накопленное по порядку; буфер становится пустым
+        items = []
+        for k in range(self.size):
+            index = (self.start + k) % self.capacity
+            items.append((self.times[index], self.ids[index], self.values[index]))
+            self.values[index] = None
+        self.start = self.size = 0
+        return items
+
+def get_value(text):
+    # Вывод `tinymix get`: без «(range 0->15)», у ENUM текущий вариант помечен «>»
+    text = re.sub(r"\s*\(.*\)\s*$", "", text.strip())
+    for token in text.replace(",", " ").split():
+        if token.startswith(">"):
+            return token[1:]
+    return text
+
+class CommandReader:
+    # Полный `list` всех контролов — только при старте и для пересинхронизации.
+    # Отслеживаемые читаются `get` по id через один долгоживущий shell: на опрос —
+    # одна запись в его stdin, Python не создаёт процессов
+    def __init__(self, command=COMMAND):
+        self.command = list(command)
+        self.shell = None
+        self.lock = asyncio.Lock()  # poll и listen читают через один shell
+
+    async def run(self, *args):
+        process = await asyncio.create_subprocess_exec(
+            *self.command, *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT)
+        output, _ = await process.communicate()
+        return output.decode(errors="replace")
+
+    async def snapshot(self):
+        output = await self.run("list")
+        for snapshot in mixer.read_dumps(output.splitlines()):
+            return snapshot
+        raise RuntimeError(f"нет таблицы контролов: {output.strip()[:200]}")
+
+    async def read(self, ids):
+        # {id: значение}; контрол, который не прочитался, пропускается
+        command = " ".join(shlex.quote(part) for part in self.command)
+        script = "".join(f"{command} get {i} 2>&1; r=$?; echo; echo \"{GET_MARKER} $r\"\n" for i in ids)
+        values = {}
+        async with self.lock:
+            try:
+                if self.shell is None or self.shell.returncode is not None:
+                    self.shell = await asyncio.create_subprocess_exec(
+                        "sh", stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE)
+                self.shell.stdin.write(script.encode())
+                await self.shell.stdin.drain()
+                for i in ids:
+                    output = b""
+                    while True:
+                        line = await self.shell.stdout.readuntil(b"\n")
+                        if line.startswith(GET_MARKER.encode()):
+                            break
+                        output += line
+                    if line.split()[-1] == b"0":
+                        values[i] = get_value(output.decode(errors="replace"))
+            except (OSError, asyncio.IncompleteReadError):
+                # shell умер: пересинхронизация полным списком, shell запустится заново
+                await self.close()
+                wanted = set(ids)
+                snapshot = await self.snapshot()
+                return {c.id: c.text() for c in snapshot.controls if c.id in wanted}
+        return values
+
+    async def close(self):
+        shell, self.shell = self.shell, None
+        if shell is not None and shell.returncode is None:
+            shell.kill()
+            await shell.wait()
+
+class TableReader:
+    # Замена устройства для проверки: состояние — файл с таблицей tinymix,
+    # который можно переписывать во время захвата
+    def __init__(self, path):
+        self.path = path
+
+    async def snapshot(self):
+        with open(self.path, encoding="utf-8", errors="replace") as f:
+            for snapshot in mixer.read_dumps(f, self.path):
+                return snapshot
+        raise RuntimeError(f"{self.path}: нет таблицы контролов")
+
+    async def read(self, ids):
+        wanted = set(ids)
+        snapshot = await self.snapshot()
+        return {c.id: c.text() for c in snapshot.controls if c.id in wanted}
+
+    async def close(self):
+        pass
+
+async def follow_file(path, idle=0.05):
+    # Строки файла по мере дописывания (как tail -f) или FIFO. Без потоков
+    # и блокирующих вызовов: цикл событий не ждёт писателя, отмена срабатывает сразу
+    fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+    writer = None
+    fifo = stat.S_ISFIFO(os.fstat(fd).st_mode)
+    loop = asyncio.get_running_loop()
+    ready = asyncio.Event()
+    try:
+        if fifo:
+            # Свой конец для записи: иначе FIFO без писателей всё время отдаёт EOF
+            writer = os.open(path, os.O_WRONLY | os.O_NONBLOCK)
+            loop.add_reader(fd, ready.set)
+        pending = b""
+        while True:
+            try:
+                chunk = os.read(fd, 65536)
+            except BlockingIOError:
+                chunk = b""
+            if chunk:
+                pending += chunk
+                *lines, pending = pending.split(b"\n")
+                for line in lines:
+                    yield line.decode(errors="replace") + "\n"
+            elif fifo:
+                ready.clear()
+                await ready.wait()
+            else:
+                await asyncio.sleep(idle)
+    finally:
+        if fifo:
+            loop.remove_reader(fd)
+        os.close(fd)
+        if writer is not None:
+            os.close(writer)
+
+async def follow_command(command):
+    process = await asyncio.create_subprocess_shell(command, stdout=asyncio.subprocess.PIPE)
+    try:
+        async for line in process.stdout:
+            yield line.decode(errors="replace")
+    finally:
+        if process.returncode is None:
+            process.terminate()
+
+class Capture:
+    def __init__(self, reader, log, watch=WATCH, interval=POLL_INTERVAL, ring_size=RING_SIZE,
+                 flush_interval=FLUSH_INTERVAL, flush_batch=FLUSH_BATCH):
+        self.reader = reader
+        self.log = log
+        self.watch = watch
+        self.interval = interval
+        self.ring = RingBuffer(ring_size)
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self.controls = {}  # id -> Control из полного снимка: тип, num и имя для журнала
+        self.values = {}  # id -> последнее значение текстом
+        self.watched = []
+        self.changes = 0
+        self.polls = 0
+        self.full = None  # asyncio.Event: буфер пора сбросить
+
+    async def start(self):
+        snapshot = await self.reader.snapshot()
+        self.log.append(snapshot, time.time())
+        self.controls = {c.id: c for c in snapshot.controls}
+        self.values = {c.id: c.text() for c in snapshot.controls}
+        self.watched = [c.id for c in snapshot.controls
+                        if any(fnmatch.fnmatchcase(c.name, pattern) for pattern in self.watch)]
+        self.full = asyncio.Event()
+
+    def record(self, control_id, value, when=None):
+        if control_id not in self.controls or self.values.get(control_id) == value:
+            return
+        self.values[control_id] = value
+        self.ring.push(time.time_ns() if when is None else when, control_id, value)
+        self.changes += 1
+        if len(self.ring) >= self.flush_batch:
+            self.full.set()
+
+    async def poll(self):
+        if not self.watched:
+            return
+        while True:
+            values = await self.reader.read(self.watched)
+            now = time.time_ns()
+            self.polls += 1
+            for control_id, value in values.items():
+                self.record(control_id, value, now)
+            await asyncio.sleep(self.interval)
+
+    async def listen(self, lines):
+        names = {c.name: c.id for c in self.controls.values()}
+        async for line in lines:
+            now = time.time_ns()
+            event = parse_event(line, names)
+            if event is None:
+                continue
+            control_id, value = event
+            if value is not None:
+                self.record(control_id, value, now)
+                continue
+            for control_id, value in (await self.reader.read([control_id])).items():
+                self.record(control_id, value, now)
+
+    def flush(self):
+        changes = []
+        for when, control_id, text in self.ring.drain():
+            base = self.controls[control_id]
+            value, malformed = mixer.parse_value(base.type, base.num, text)
+            changes.append((when / 1e9, mixer.Control(control_id, base.type, base.num, base.name, value, malformed)))
+        if changes:
+            self.log.append_changes(changes)
+        return len(changes)
+
+    async def flusher(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.full.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.full.clear()
+            self.flush()
+
+    async def run(self, events=None, duration=None):
+        # Работает до duration секунд или до отмены; остаток буфера пишется всегда
+        await self.start()
+        tasks = [asyncio.create_task(self.poll()), asyncio.create_task(self.flusher())]
+        if events is not None:
+            tasks.append(asyncio.create_task(self.listen(events)))
+        try:
+            if duration is None:
+                await asyncio.gather(*tasks)
+            else:
+                await asyncio.sleep(duration)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self.reader.close()
+            self.flush()
+
+async def run_capture(args):
+    reader = TableReader(args.table) if args.table else CommandReader()
+    log = mixer.SnapshotLog(args.log, args.baseline_every)
+    capture = Capture(reader, log, args.watch, args.interval, args.ring_size, args.flush_interval, args.flush_batch)
+    events = None
+    if args.events_file:
+        events = follow_file(args.events_file)
+    elif args.events_command:
+        events = follow_command(args.events_command)
+
+    task = asyncio.create_task(capture.run(events, args.duration))
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, task.cancel)
+        except (NotImplementedError, RuntimeError):
+            pass
+    started = time.perf_counter()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    elapsed = time.perf_counter() - started
+    print(f"Отслеживалось {len(capture.watched)} контролов, опросов {capture.polls} за {elapsed:.1f} с, "
+          f"изменений {capture.changes}, потеряно {capture.ring.dropped}", file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description="Захват изменений mixer controls")
+    parser.add_argument("--watch", nargs="+", default=WATCH, metavar="ШАБЛОН",
+                        help="имена контролов для частого опроса, можно с * и ?")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL, metavar="СЕКУНД")
+    parser.add_argument("--log", default="audio_mixer.log", metavar="ФАЙЛ", help="журнал снимков (как у auto_log.py)")
+    parser.add_argument("--events-file", metavar="ФАЙЛ", help="поток событий из файла или FIFO")
+    parser.add_argument("--events-command", metavar="КОМАНДА", help="поток событий из команды, например alsactl monitor")
+    parser.add_argument("--table", metavar="ФАЙЛ", help="вместо устройства читать таблицу tinymix из файла")
+    parser.add_argument("--ring-size", type=int, default=RING_SIZE)
+    parser.add_argument("--flush-interval", type=float, default=FLUSH_INTERVAL, metavar="СЕКУНД")
+    parser.add_argument("--flush-batch", type=int, default=FLUSH_BATCH)
+    parser.add_argument("--baseline-every", type=int, default=BASELINE_EVERY, metavar="ИЗМЕНЕНИЙ")
+    parser.add_argument("--duration", type=float, metavar="СЕКУНД", help="остановиться через столько секунд")
+    args = parser.parse_args()
+    if args.events_file and not os.path.exists(args.events_file):
+        parser.error(f"нет файла {args.events_file}")
+    asyncio.run(run_capture(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,882 @@
+#!/usr/bin/env python3
+# Разбор дампов `tinyalsa-mixer list` (Log.txt, log2.txt, audio_log_*.txt)
+# и столбцовое хранилище снимков с индексом по id и имени контрола:
+#   python mixer.py Log.txt log2.txt audio_log_*.txt --store mixer.store
+#   python mixer.py --store mixer.store --find '*_scenario' --value On
+#   python mixer.py Log.txt log2.txt --diff
+#   python mixer.py --dir captures --changes 'Headset Volume'
+import os
+import re
+import sys
+import time
+import pickle
+import zlib
+import argparse
+import fnmatch
+import bisect
+import json
+import struct
+import hashlib
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # Без numpy матрица различий считается по парам
+
+TYPES = ("INT", "BOOL", "ENUM", "BYTE", "INT64", "IEC958")
+NUMERIC = ("INT", "BOOL", "BYTE", "INT64")  # Значение — num чисел через пробел
+
+# Столбцы строки таблицы: id, type и num по 8 символов, имя — 40 (tinymix печатает
+# табуляции, в логах они уже развёрнуты в пробелы). Длинные имена вылезают за 40.
+# Смещения считаются от начала типа: у склеенных строк поле id бывает другой ширины
+NAME_OFFSET = 16
+NAME_WIDTH = 40
+
+ROW_RE = re.compile(r"(\d+) +(INT64|INT|BOOL|ENUM|BYTE|IEC958) +(\d+)( |$)")
+TYPE_RE = re.compile(r" (INT64|INT|BOOL|ENUM|BYTE|IEC958) +(\d+)( |$)")
+TIME_RE = re.compile(r"# (\d{4}-\d\d-\d\d \d\d:\d\d)")
+
+# Журнал снимков (SnapshotLog): после MAGIC идут записи — заголовок RECORD_HEADER
+# (длина тела, время unix, вид) и тело, сжатый JSON
+LOG_MAGIC = b"MIXLOG1\n"
+RECORD_HEADER = struct.Struct("<IdB")
+BASELINE, DELTA = 0, 1
+BASELINE_EVERY = 144  # Дельт между полными снимками: раз в сутки при опросе раз в 10 минут
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+DIGEST_MOD = 1 << 128  # Отпечаток снимка — сумма отпечатков строк по этому модулю
+STORE_VERSION = 3  # Меняется вместе со столбцами MixerStore
+
+class Control:
+    # Одна строка таблицы. value — кортеж чисел для NUMERIC (BOOL: On=1, Off=0),
+    # строка для ENUM и для всего, что не разобралось. malformed — значений не столько,
+    # сколько обещает num, или они не читаются
+    __slots__ = ('id', 'type', 'num', 'name', 'value', 'malformed')
+
+    def __init__(self, id, type, num, name, value, malformed=False):
+        self.id = id
+        self.type = type
+        self.num = num
+        self.name = name
+        self.value = value
+        self.malformed = malformed
+
+    def text(self):
+        # Значение так, как его печатает tinymix
+        if isinstance(self.value, str):
+            return self.value
+        if self.type == "BOOL":
+            return " ".join("On" if v else "Off" for v in self.value)
+        if self.type == "BYTE":
+            return " ".join(f"{v:02x}" for v in self.value)
+        return " ".join(str(v) for v in self.value)
+
+    def __repr__(self):
+        return f"Control({self.id}, {self.type}, {self.name!r}, {self.text()!r})"
+
+class Snapshot:
+    # Один дамп: откуда он, когда снят, заголовок и строки таблицы
+    def __init__(self, source=None, time=None):
+        self.source = source
+        self.time = time
+        self.mixer = None
+        self.expected = None  # «Number of controls» из заголовка
+        self.controls = []
+        self.removed = None  # У дельты журнала: controls — только изменившиеся, здесь id удалённых
+
+def parse_value(type, num, text):
+    text = text.strip()
+    if type not in NUMERIC:
+        return text, False
+    tokens = text.split()
+    try:
+        if type == "BOOL":
+            values = tuple(1 if t == "On" else 0 if t == "Off" else int(t) for t in tokens)
+        elif type == "BYTE":
+            values = tuple(int(t, 16) for t in tokens)
+        else:
+            values = tuple(int(t) for t in tokens)
+    except ValueError:
+        return text, True
+    return values, len(values) != num
+
+def split_name(type, num, rest):
+    # Имя длиннее 40 символов сдвигает значение. Байты tinymix печатает через два
+    # пробела, поэтому режем по первому двойному; иначе значение — последние num слов
+    cut = rest.find("  ")
+    if cut >= 0:
+        return rest[:cut], rest[cut:]
+    parts = rest.rsplit(" ", num if type in NUMERIC else 1)
+    if len(parts) == 1:
+        return rest, ""
+    return parts[0], " " + " ".join(parts[1:])
+
+def parse_row(control_id, type, num, rest):
+    # rest — имя и значение, начиная со столбца имени
+    if len(rest) <= NAME_WIDTH or rest[NAME_WIDTH - 1] == " ":
+        name, value = rest[:NAME_WIDTH], rest[NAME_WIDTH:]
+    else:
+        name, value = split_name(type, num, rest)
+    value, malformed = parse_value(type, num, value)
+    return Control(control_id, type, num, name.strip(), value, malformed)
+
+def split_rows(line):
+    # Строки таблицы из одной строки файла. Иногда строки склеены без перевода
+    # строки: «vow_barge_in_irq_id  1512      BOOL …» — это значение 15 и строка 12.
+    # Склейку выдаёт тип, перед которым стоит id, на единицу больший предыдущего:
+    # сверка с ожидаемым id не даёт цифрам значения прилипнуть к id
+    match = ROW_RE.match(line)
+    if match is None:
+        return []
+    rows = []
+    control_id, type, num, start = int(match.group(1)), match.group(2), int(match.group(3)), match.start(2)
+    for found in TYPE_RE.finditer(line, start + NAME_OFFSET):
+        head = line[start + NAME_OFFSET:found.start(1)].rstrip()
+        next_id = str(control_id + 1)
+        if not head.endswith(next_id):
+            continue
+        end = start + NAME_OFFSET + len(head) - len(next_id)
+        rows.append(parse_row(control_id, type, num, line[start + NAME_OFFSET:end]))
+        control_id, type, num, start = control_id + 1, found.group(1), int(found.group(2)), found.start(1)
+    rows.append(parse_row(control_id, type, num, line[start + NAME_OFFSET:]))
+    return rows
+
+def read_dumps(lines, source=None):
+    # Потоково: строки читаются по одной, наружу отдаются готовые снимки.
+    # Годится и файл целиком из нескольких дампов (audio_log_*.txt с «# дата»)
+    snapshot = None
+    stamp = None
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if ROW_RE.match(line):
+            if snapshot is None:
+                snapshot = Snapshot(source, stamp)
+            snapshot.controls.extend(split_rows(line))
+            continue
+
+        match = TIME_RE.match(line)
+        if match:
+            stamp = match.group(1)
+        elif line.startswith("Mixer name:"):
+            if snapshot is not None and snapshot.controls:
+                yield snapshot
+            snapshot = Snapshot(source, stamp)
+            snapshot.mixer = line.split(":", 1)[1].strip().strip("'")
+        elif line.startswith("Number of controls:") and snapshot is not None:
+            snapshot.expected = int(line.split(":", 1)[1])
+        elif line.strip() and snapshot is not None and snapshot.controls:
+            # Таблица кончилась: дальше вывод других команд
+            yield snapshot
+            snapshot = None
+    if snapshot is not None and snapshot.controls:
+        yield snapshot
+
+def format_time(when):
+    # С миллисекундами: capture.py пишет изменения точнее секунды
+    return time.strftime(TIME_FORMAT, time.localtime(when)) + f".{int(when * 1000) % 1000:03d}"
+
+def fingerprint(control):
+    # 64-битный отпечаток значения: одинаковые значения сравниваются одним числом.
+    # Ключ (id, имя) в отпечаток не входит — по нему строки выравниваются
+    data = f"{control.type}|{control.num}|{control.value!r}".encode()
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little", signed=True)
+
+def value_changes(old, new):
+    # Что поменялось в значении: [(номер, было, стало)]; у строк номер None
+    if isinstance(old, str) or isinstance(new, str):
+        return [] if old == new else [(None, old, new)]
+    changes = [(i, a, b) for i, (a, b) in enumerate(zip(old, new)) if a != b]
+    for i in range(min(len(old), len(new)), max(len(old), len(new))):
+        changes.append((i, old[i] if i < len(old) else None, new[i] if i < len(new) else None))
+    return changes
+
+def write_table(snapshot, out=sys.stdout):
+    # Снимок в виде таблицы tinymix, которую снова можно разобрать read_dumps
+    out.write(f"Mixer name: '{snapshot.mixer}'\n")
+    out.write(f"Number of controls: {len(snapshot.controls)}\n")
+    out.write("ctl\ttype\tnum\tname                                    value\n\n".expandtabs())
+    for c in snapshot.controls:
+        out.write(f"{c.id:<8}{c.type:<8}{c.num:<8}{c.name:<40} {c.text()}\n")
+
+def read_file(path):
+    # Время снимка — из строки «# дата», а если её нет, то по времени файла.
+    # Журнал SnapshotLog узнаётся по LOG_MAGIC и отдаётся записями как есть:
+    # дельта — только изменившиеся контролы, без разворачивания в полный снимок
+    with open(path, "rb") as f:
+        is_log = f.read(len(LOG_MAGIC)) == LOG_MAGIC
+    if is_log:
+        yield from SnapshotLog(path).entries()
+        return
+    stamp = time.strftime("%Y-%m-%d %H:%M", time.localtime(os.path.getmtime(path)))
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for snapshot in read_dumps(f, path):
+            if snapshot.time is None:
+                snapshot.time = stamp
+            yield snapshot
+
+def read_directory(path):
+    # Все снимки каталога захвата (дампы и журналы) по времени
+    snapshots = []
+    for name in sorted(os.listdir(path)):
+        full = os.path.join(path, name)
+        if os.path.isfile(full):
+            snapshots.extend(read_file(full))
+    snapshots.sort(key=lambda s: s.time or "")
+    return snapshots
+
+def control_row(control):
+    value = control.value if isinstance(control.value, str) else list(control.value)
+    return [control.id, control.type, control.num, control.name, value, control.malformed]
+
+def row_control(row):
+    control_id, type, num, name, value, malformed = row
+    return Control(control_id, type, num, name, value if isinstance(value, str) else tuple(value), malformed)
+
+def same_control(a, b):
+    return a.type == b.type and a.num == b.num and a.name == b.name and a.value == b.value
+
+class SnapshotLog:
+    # Дописываемый журнал снимков: полный снимок (baseline), дальше только контролы,
+    # которые изменились (delta); без изменений не пишется ничего. Каждые
+    # baseline_every дельт — снова полный снимок, чтобы восстановление на любой
+    # момент не проходило весь журнал. Время лежит в несжатом заголовке записи,
+    # поэтому поиск по времени перескакивает тела не распаковывая
+    def __init__(self, path, baseline_every=BASELINE_EVERY):
+        self.path = path
+        self.baseline_every = baseline_every
+        self.state = None  # {id: Control} последнего записанного снимка
+        self.mixer = None
+        self.expected = None
+        self.deltas = 0  # Дельт после последнего полного снимка
+        if os.path.exists(path) and os.path.getsize(path):
+            self.recover()
+
+    def recover(self):
+        # Телефон может убить процесс посреди записи. Файл обрезается по концу
+        # последней целой записи, иначе следующая легла бы после обрывка и журнал
+        # перестал бы читаться дальше этого места
+        end = 0
+        with open(self.path, "rb") as f:
+            head = f.read(len(LOG_MAGIC))
+        if head == LOG_MAGIC:
+            end = len(LOG_MAGIC)
+            # Нужно только последнее состояние: контролы не сортируются на каждой записи
+            for kind, _, body, state, end in self.walk():
+                if kind == BASELINE:
+                    self.deltas = 0
+                    self.mixer = body["mixer"]
+                    self.expected = body["expected"]
+                else:
+                    self.deltas += 1
+                self.state = state
+        elif not LOG_MAGIC.startswith(head):
+            raise ValueError(f"{self.path}: не журнал снимков")
+        if os.path.getsize(self.path) > end:
+            with open(self.path, "r+b") as f:
+                f.truncate(end)
+
+    def append(self, snapshot, when=None):
+        # Вид записанной записи или None, если ничего не изменилось
+        when = time.time() if when is None else when
+        controls = {c.id: c for c in snapshot.controls}
+        if (self.state is None or self.deltas >= self.baseline_every
+                or snapshot.mixer != self.mixer or snapshot.expected != self.expected):
+            kind = BASELINE
+            body = {"mixer": snapshot.mixer, "expected": snapshot.expected,
+                    "controls": [control_row(c) for c in snapshot.controls]}
+        else:
+            old = self.state
+            changed = [control_row(c) for i, c in controls.items() if i not in old or not same_control(old[i], c)]
+            removed = [i for i in old if i not in controls]
+            if not changed and not removed:
+                return None
+            kind = DELTA
+            body = {"changed": changed, "removed": removed}
+
+        self.write([self.encode(when, kind, body)])
+        self.deltas = 0 if kind == BASELINE else self.deltas + 1
+        self.state = controls
+        self.mixer = snapshot.mixer
+        self.expected = snapshot.expected
+        return kind
+
+    def append_changes(self, changes):
+        # Отдельные изменения [(время unix, Control)] после полного снимка: по дельте
+        # на изменение, чтобы у каждого было своё время, но всё одной записью в файл
+        if self.state is None:
+            raise ValueError("перед изменениями в журнале нужен полный снимок")
+        records = []
+        for when, control in changes:
+            self.state[control.id] = control
+            if self.deltas >= self.baseline_every:
+                # Как в append: после baseline_every дельт — полный снимок с этим изменением
+                controls = sorted(self.state.values(), key=lambda c: c.id)
+                records.append(self.encode(when, BASELINE, {"mixer": self.mixer, "expected": self.expected,
+                                                            "controls": [control_row(c) for c in controls]}))
+                self.deltas = 0
+            else:
+                records.append(self.encode(when, DELTA, {"changed": [control_row(control)], "removed": []}))
+                self.deltas += 1
+        self.write(records)
+
+    @staticmethod
+    def encode(when, kind, body):
+        data = zlib.compress(json.dumps(body, ensure_ascii=False, separators=(",", ":")).encode(), 9)
+        return RECORD_HEADER.pack(len(data), when, kind) + data
+
+    def write(self, records):
+        with open(self.path, "ab") as f:
+            if f.tell() == 0:
+                f.write(LOG_MAGIC)
+            f.write(b"".join(records))
+
+    def records(self, f, position=None):
+        # (смещение тела, длина, время, вид) по всем записям, тела пропускаются.
+        # position — смещение заголовка, с которого начать
+        if f.read(len(LOG_MAGIC)) != LOG_MAGIC:
+            raise ValueError(f"{self.path}: не журнал снимков")
+        if position is not None:
+            f.seek(position)
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return  # Конец или недописанная последняя запись
+            length, when, kind = RECORD_HEADER.unpack(header)
+            offset = f.tell()
+            if f.seek(length, os.SEEK_CUR) > os.fstat(f.fileno()).st_size:
+                return
+            yield offset, length, when, kind
+
+    def replay(self, position=None, until=None):
+        # (вид, снимок) по записям с заголовка position, пока время не больше until.
+        # Снимок один и тот же объект, он меняется от записи к записи
+        snapshot = Snapshot(self.path)
+        for kind, when, body, state, _ in self.walk(position, until):
+            if kind == BASELINE:
+                snapshot.mixer = body["mixer"]
+                snapshot.expected = body["expected"]
+            snapshot.time = format_time(when)
+            snapshot.controls = sorted(state.values(), key=lambda c: c.id)
+            yield kind, snapshot
+
+    def bodies(self, position=None, until=None):
+        # (вид, время, тело, конец записи) с заголовка position. Битое тело (запись
+        # оборвалась, а длина в заголовке уцелела) считается концом журнала
+        with open(self.path, "rb") as headers, open(self.path, "rb") as f:
+            for offset, length, when, kind in self.records(headers, position):
+                if until is not None and when > until:
+                    return
+                f.seek(offset)
+                try:
+                    body = json.loads(zlib.decompress(f.read(length)))
+                except (zlib.error, ValueError):
+                    return
+                yield kind, when, body, offset + length
+
+    def walk(self, position=None, until=None):
+        # (вид, время, тело, {id: Control}, конец записи): состояние после каждой
+        # записи. Словарь один и тот же, сортирует его только тот, кому нужен снимок
+        state = {}
+        for kind, when, body, end in self.bodies(position, until):
+            if kind == BASELINE:
+                state = {row[0]: row_control(row) for row in body["controls"]}
+            else:
+                for row in body["changed"]:
+                    state[row[0]] = row_control(row)
+                for control_id in body["removed"]:
+                    state.pop(control_id, None)
+            yield kind, when, body, state, end
+
+    def entries(self):
+        # Записи без разворачивания: у полного снимка все контролы, у дельты —
+        # изменившиеся в controls и id удалённых в removed (см. MixerStore.add)
+        mixer = expected = None
+        for kind, when, body, _ in self.bodies():
+            snapshot = Snapshot(self.path, format_time(when))
+            if kind == BASELINE:
+                mixer, expected = body["mixer"], body["expected"]
+                snapshot.controls = [row_control(row) for row in body["controls"]]
+            else:
+                snapshot.controls = [row_control(row) for row in body["changed"]]
+                snapshot.removed = body["removed"]
+            snapshot.mixer, snapshot.expected = mixer, expected
+            yield snapshot
+
+    def snapshots(self):
+        # (время, снимок) после каждой записи; снимки — отдельные объекты
+        for _, snapshot in self.replay():
+            copy = Snapshot(snapshot.source, snapshot.time)
+            copy.mixer, copy.expected, copy.controls = snapshot.mixer, snapshot.expected, snapshot.controls
+            yield snapshot.time, copy
+
+    def state_at(self, when):
+        # Полное состояние на момент when (unix) или None, если журнал начат позже.
+        # По заголовкам находится последний полный снимок до when, с него и
+        # распаковываются записи; контролы сортируются один раз, в конце
+        with open(self.path, "rb") as f:
+            position = None
+            for offset, _, stamp, kind in self.records(f):
+                if stamp > when:
+                    break
+                if kind == BASELINE:
+                    position = offset - RECORD_HEADER.size
+        if position is None:
+            return None
+        snapshot = Snapshot(self.path)
+        state = {}
+        for kind, stamp, body, state, _ in self.walk(position, when):
+            if kind == BASELINE:
+                snapshot.mixer = body["mixer"]
+                snapshot.expected = body["expected"]
+            snapshot.time = format_time(stamp)
+        snapshot.controls = sorted(state.values(), key=lambda c: c.id)
+        return snapshot
+
+def row_digest(key, mark):
+    return int.from_bytes(hashlib.blake2b(struct.pack("<iq", key, mark), digest_size=16).digest(), "little")
+
+class MixerStore:
+    # Все снимки в плоских столбцах, строка на контрол в снимке. Число или первое
+    # значение лежит в first (у ENUM — номер строки в strings), весь массив значений —
+    # срезом offset:offset+count в values. Ключ — пара (id, имя): по нему, по id
+    # и по имени есть индексы, поэтому запрос не перебирает всё хранилище.
+    # Дельта журнала хранит только изменившиеся строки и ссылку на предыдущий
+    # снимок того же файла (parent); полное состояние собирает state()
+    def __init__(self):
+        self.version = STORE_VERSION
+        self.snapshots = []  # (source, time, mixer, expected)
+        self.snapshot = array('i')
+        self.key = array('i')
+        self.kind = bytearray()  # Номер в TYPES
+        self.first = array('q')
+        self.offset = array('q')
+        self.count = array('i')
+        self.values = array('q')
+        self.malformed = bytearray()
+        self.strings = []
+        self.string_index = {}
+        self.keys = []  # (id, имя, num)
+        self.key_index = {}
+        self.rows_by_key = []  # Номера строк по ключу, по возрастанию снимка
+        self.keys_by_id = {}
+        self.keys_by_name = {}
+        self.fingerprint = array('q')  # fingerprint() по строкам
+        self.starts = array('q')  # Первая строка снимка: строки снимка идут подряд
+        self.digests = []  # Отпечаток снимка целиком: равны — снимки одинаковые
+        self.parent = array('i')  # Снимок, к которому применяется дельта; -1 — полный снимок
+        self.child = array('i')  # Следующая дельта той же цепочки; -1 — цепочка кончилась
+        self.root = array('i')  # Полный снимок, с которого начинается цепочка
+        self.removed = {}  # Номер дельты -> ключи удалённых контролов
+        self.heads = {}  # source -> (номер последнего снимка, {ключ: строка}) для следующей дельты
+        self.pairs = {}  # Кеш frozenset((ключ, отпечаток)) по снимку для diff
+        self.last_state = None  # Кеш (номер снимка, state()): соседние снимки собираются за шаг
+
+    def intern(self, text):
+        index = self.string_index.get(text)
+        if index is None:
+            index = self.string_index[text] = len(self.strings)
+            self.strings.append(text)
+        return index
+
+    def key_of(self, control):
+        pair = (control.id, control.name)
+        index = self.key_index.get(pair)
+        if index is None:
+            index = self.key_index[pair] = len(self.keys)
+            self.keys.append((control.id, control.name, control.num))
+            self.rows_by_key.append(array('i'))
+            self.keys_by_id.setdefault(control.id, []).append(index)
+            self.keys_by_name.setdefault(control.name, []).append(index)
+        return index
+
+    def add(self, snapshot):
+        # Номер снимка в хранилище. Дельта (snapshot.removed не None) стоит столько,
+        # сколько в ней изменений: отпечаток снимка правится по изменившимся строкам
+        index = len(self.snapshots)
+        delta = snapshot.removed is not None
+        if delta:
+            head = self.heads.get(snapshot.source)
+            if head is None:
+                raise ValueError(f"{snapshot.source}: дельта без полного снимка")
+            base, state = head
+            digest = self.digests[base]
+        else:
+            base, state, digest = -1, {}, 0
+        self.snapshots.append((snapshot.source, snapshot.time, snapshot.mixer, snapshot.expected))
+        self.starts.append(len(self.key))
+        self.parent.append(base)
+        self.child.append(-1)
+        if delta:
+            self.child[base] = index
+        self.root.append(self.root[base] if delta else index)
+        if delta:
+            removed = [key for control_id in snapshot.removed for key in self.keys_by_id.get(control_id, [])
+                       if key in state]
+            for key in removed:
+                digest -= row_digest(key, self.fingerprint[state.pop(key)])
+            if removed:
+                self.removed[index] = removed
+        for control in snapshot.controls:
+            key = self.key_of(control)
+            mark = fingerprint(control)
+            if delta:
+                # Тот же id под другим именем заменяет старый ключ, как в журнале
+                for old in self.keys_by_id[control.id]:
+                    if old in state:
+                        digest -= row_digest(old, self.fingerprint[state.pop(old)])
+            digest += row_digest(key, mark)
+            state[key] = len(self.key)
+            self.fingerprint.append(mark)
+            self.rows_by_key[key].append(len(self.key))
+            self.snapshot.append(index)
+            self.key.append(key)
+            self.kind.append(TYPES.index(control.type))
+            self.malformed.append(control.malformed)
+            value = control.value
+            self.offset.append(len(self.values))
+            if isinstance(value, str):
+                self.first.append(self.intern(value))
+                self.count.append(-1)  # Строка, а не числа
+            else:
+                self.first.append(value[0] if value else 0)
+                self.count.append(len(value))
+                self.values.extend(value)
+        self.digests.append(digest % DIGEST_MOD)
+        self.heads[snapshot.source] = (index, state)
+        return index
+
+    def add_file(self, path):
+        return [self.add(snapshot) for snapshot in read_file(path)]
+
+    def add_directory(self, path):
+        return [self.add(snapshot) for snapshot in read_directory(path)]
+
+    def snapshot_rows(self, index):
+        # Строки, записанные этим снимком; у дельты — только изменения
+        end = self.starts[index + 1] if index + 1 < len(self.starts) else len(self.key)
+        return range(self.starts[index], end)
+
+    def state(self, index):
+        # {ключ: строка} полного состояния снимка. У дельты собирается от ближайшего
+        # полного снимка (или от снимка в кеше) вперёд. Результат не менять
+        chain = []
+        while True:
+            if self.last_state is not None and self.last_state[0] == index:
+                state = self.last_state[1]
+                break
+            chain.append(index)
+            if self.parent[index] < 0:
+                state = {}
+                break
+            index = self.parent[index]
+        if not chain:
+            return state
+        state = dict(state)
+        for index in reversed(chain):
+            for key in self.removed.get(index, ()):
+                state.pop(key, None)
+            delta = self.parent[index] >= 0
+            for row in self.snapshot_rows(index):
+                key = self.key[row]
+                if delta:
+                    for old in self.keys_by_id[self.keys[key][0]]:
+                        state.pop(old, None)
+                state[key] = row
+        self.last_state = (chain[0], state)
+        return state
+
+    def marks(self, index):
+        # {(ключ, отпечаток)} снимка; считается один раз
+        pairs = self.pairs.get(index)
+        if pairs is None:
+            pairs = self.pairs[index] = frozenset((key, self.fingerprint[row])
+                                                  for key, row in self.state(index).items())
+        return pairs
+
+    def distance(self, a, b):
+        # Сколько контролов различается между снимками a и b
+        if self.digests[a] == self.digests[b]:
+            return 0
+        return len({key for key, _ in self.marks(a) ^ self.marks(b)})
+
+    def distances(self):
+        # Матрица distance() для всех пар снимков. С numpy — таблица отпечатков
+        # снимок × ключ (0 — контрола нет) и сравнение строки со всей таблицей сразу;
+        # одинаковые по digests снимки считаются один раз
+        count = len(self.snapshots)
+        unique = {}
+        for index, digest in enumerate(self.digests):
+            unique.setdefault(digest, index)
+        column = [unique[digest] for digest in self.digests]
+        order = sorted(set(column))
+        if np is None:
+            rows = {a: {b: self.distance(a, b) for b in order} for a in order}
+        else:
+            table = np.zeros((count, len(self.keys)), dtype=np.int64)
+            table[np.frombuffer(self.snapshot, np.int32), np.frombuffer(self.key, np.int32)] = \
+                np.frombuffer(self.fingerprint, np.int64)
+            # Строка дельты — строка её parent с изменениями поверх; parent всегда раньше
+            for index in np.flatnonzero(np.frombuffer(self.parent, np.int32) >= 0).tolist():
+                rows = self.snapshot_rows(index)
+                keys = self.key[rows.start:rows.stop]
+                line = table[self.parent[index]].copy()
+                for key in keys:
+                    line[self.keys_by_id[self.keys[key][0]]] = 0
+                line[self.removed.get(index, [])] = 0
+                line[keys] = table[index, keys]
+                table[index] = line
+            table = table[order]
+            rows = {a: dict(zip(order, (table != table[i]).sum(axis=1).tolist())) for i, a in enumerate(order)}
+        return [[rows[column[a]][column[b]] for b in range(count)] for a in range(count)]
+
+    def diff(self, a, b):
+        # Различия снимков a и b: ("added" | "removed" | "changed" | "renamed", было, стало).
+        # Строки выравниваются по (id, имя), сравниваются отпечатки, а Control
+        # собирается только для различающихся. Тот же id с другим именем — renamed
+        if self.digests[a] == self.digests[b]:
+            return []
+        old = self.state(a)
+        new = self.state(b)
+        result = []
+        removed = {}
+        for key, row in old.items():
+            other = new.get(key)
+            if other is None:
+                removed[self.keys[key][0]] = row
+            elif self.fingerprint[row] != self.fingerprint[other]:
+                result.append(("changed", self.control(row), self.control(other)))
+        for key, row in new.items():
+            if key in old:
+                continue
+            before = removed.pop(self.keys[key][0], None)
+            if before is None:
+                result.append(("added", None, self.control(row)))
+            else:
+                result.append(("renamed", self.control(before), self.control(row)))
+        result.extend(("removed", self.control(row), None) for row in removed.values())
+        result.sort(key=lambda item: (item[1] or item[2]).id)
+        return result
+
+    def history(self, pattern=None, control_id=None):
+        # Когда менялся контрол: (номер снимка, было, стало) по каждому ключу,
+        # в порядке добавления снимков. Идёт только по строкам этих ключей
+        changes = []
+        for key in self.match_keys(pattern, control_id):
+            previous = None
+            for row in self.rows_by_key[key]:
+                if previous is not None and self.fingerprint[row] != self.fingerprint[previous]:
+                    changes.append((self.snapshot[row], self.control(previous), self.control(row)))
+                previous = row
+        changes.sort(key=lambda change: (change[0], change[2].id))
+        return changes
+
+    def control(self, row):
+        control_id, name, num = self.keys[self.key[row]]
+        count = self.count[row]
+        if count < 0:
+            value = self.strings[self.first[row]]
+        else:
+            offset = self.offset[row]
+            value = tuple(self.values[offset:offset + count])
+        return Control(control_id, TYPES[self.kind[row]], num, name, value, bool(self.malformed[row]))
+
+    def match_keys(self, pattern=None, control_id=None):
+        # Ключи по шаблону имени (fnmatch) и/или id
+        if control_id is not None:
+            keys = self.keys_by_id.get(control_id, [])
+            if pattern is None:
+                return list(keys)
+            return [k for k in keys if fnmatch.fnmatchcase(self.keys[k][1], pattern)]
+        if pattern is None:
+            return list(range(len(self.keys)))
+        if not any(c in pattern for c in "*?["):
+            return list(self.keys_by_name.get(pattern, []))
+        return [k for name, keys in self.keys_by_name.items() if fnmatch.fnmatchcase(name, pattern) for k in keys]
+
+    def spans(self, keys, snapshots=None):
+        # По каждому ключу — список (строка, номера снимков, где она действует).
+        # Строка полного снимка действует только в нём. Строка дельты журнала — и в
+        # следующих снимках цепочки (child), пока контрол с тем же id не запишется
+        # заново или не удалится: запрос видит значение в каждом снимке, а не только
+        # там, где оно поменялось. snapshots — range или множество номеров снимков
+        member = None
+        if snapshots is None:
+            start, stop = 0, len(self.snapshots)
+        elif isinstance(snapshots, range) and snapshots.step == 1:
+            start, stop = max(snapshots.start, 0), min(snapshots.stop, len(self.snapshots))
+        else:
+            member = snapshots
+            start, stop = min(snapshots, default=0), min(max(snapshots, default=-1) + 1, len(self.snapshots))
+        if start >= stop:
+            return
+        # Строки раньше корня самой ранней цепочки до диапазона не доживают
+        floor = min(self.root[start:stop])
+        for key in keys:
+            rows = self.rows_by_key[key]
+            # Строки ключа идут по возрастанию снимка: диапазон ищется бинарно
+            first = bisect.bisect_left(rows, floor, key=self.snapshot.__getitem__)
+            last = bisect.bisect_left(rows, stop, key=self.snapshot.__getitem__)
+            writes = None  # Снимки, где записан контрол с тем же id
+            spans = []
+            for row in rows[first:last]:
+                index = self.snapshot[row]
+                if self.child[index] < 0:
+                    # Полный снимок без дельт после него — обычный случай
+                    if index >= start and (member is None or index in member):
+                        spans.append((row, (index,)))
+                    continue
+                indices = []
+                while index < stop:
+                    if index >= start and (member is None or index in member):
+                        indices.append(index)
+                    index = self.child[index]
+                    if index < 0:
+                        break
+                    if writes is None:
+                        writes = {self.snapshot[r] for other in self.keys_by_id[self.keys[key][0]]
+                                  for r in self.rows_by_key[other]}
+                    if index in writes or key in self.removed.get(index, ()):
+                        break
+                if indices:
+                    spans.append((row, indices))
+            yield spans
+
+    def rows(self, keys, snapshots=None):
+        # (номер снимка, строка) по ключам, у каждого ключа по возрастанию снимка
+        for spans in self.spans(keys, snapshots):
+            found = [(index, row) for row, indices in spans for index in indices]
+            found.sort()
+            yield from found
+
+    def matching_rows(self, keys, text, snapshots=None):
+        # (номер снимка, строка) со значением text в том виде, как его печатает tinymix.
+        # Значение переводится в код один раз на тип, дальше сравниваются числа из
+        # first; строка дельты проверяется один раз на все снимки, где она действует
+        string = self.string_index.get(text)
+        targets = {}
+
+        def matches(row):
+            count = self.count[row]
+            if count < 0:
+                return self.first[row] == string
+            kind = self.kind[row]
+            target = targets.get(kind)
+            if target is None:
+                target = targets[kind] = parse_value(TYPES[kind], 0, text)[0]
+            if isinstance(target, str) or len(target) != count:
+                return False
+            if count == 1:
+                return self.first[row] == target[0]
+            return tuple(self.values[self.offset[row]:self.offset[row] + count]) == target
+
+        for spans in self.spans(keys, snapshots):
+            found = [(index, row) for row, indices in spans if matches(row) for index in indices]
+            found.sort()
+            yield from found
+
+    def find(self, pattern=None, value=None, control_id=None, snapshots=None):
+        # (номер снимка, Control) для контролов по шаблону имени и значению.
+        # У дельт журнала значение берётся из восстановленного состояния снимка
+        keys = self.match_keys(pattern, control_id)
+        rows = self.rows(keys, snapshots) if value is None else self.matching_rows(keys, value, snapshots)
+        for index, row in rows:
+            yield index, self.control(row)
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['pairs'] = {}  # Кеши не сохраняем
+        state['last_state'] = None
+        return state
+
+    def save(self, path):
+        data = zlib.compress(pickle.dumps(self, pickle.HIGHEST_PROTOCOL), 6)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    @staticmethod
+    def load(path):
+        with open(path, "rb") as f:
+            store = pickle.loads(zlib.decompress(f.read()))
+        if getattr(store, "version", 1) != STORE_VERSION:
+            raise ValueError(f"{path}: хранилище старого формата, соберите его заново")
+        return store
+
+def print_change(kind, old, new):
+    if kind == "added":
+        print(f"+ {new.id:4} {new.name}: {new.text()}")
+    elif kind == "removed":
+        print(f"- {old.id:4} {old.name}: {old.text()}")
+    elif kind == "renamed":
+        print(f"~ {new.id:4} {old.name} -> {new.name}: {new.text()}")
+    else:
+        changes = value_changes(old.value, new.value)
+        if len(changes) == 1 and (changes[0][0] is None or new.num == 1):
+            print(f"~ {new.id:4} {new.name}: {old.text()} -> {new.text()}")
+        else:
+            # У многозначных контролов — только изменившиеся элементы
+            items = ", ".join(f"[{i}] {a} -> {b}" for i, a, b in changes)
+            print(f"~ {new.id:4} {new.name}: {items}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Разбор дампов tinyalsa-mixer")
+    parser.add_argument("files", nargs="*", help="дампы (Log.txt, audio_log_*.txt)")
+    parser.add_argument("--store", metavar="ФАЙЛ", help="хранилище: дополняется файлами и сохраняется")
+    parser.add_argument("--find", metavar="ШАБЛОН", help="имя контрола, можно с * и ?")
+    parser.add_argument("--id", type=int, help="id контрола")
+    parser.add_argument("--value", help="только с этим значением, например On")
+    parser.add_argument("--dir", metavar="КАТАЛОГ", help="добавить все снимки каталога захвата по времени")
+    parser.add_argument("--diff", action="store_true", help="различия соседних снимков")
+    parser.add_argument("--changes", metavar="ШАБЛОН", help="когда менялись контролы с таким именем")
+    parser.add_argument("--matrix", action="store_true", help="число различий для каждой пары снимков")
+    args = parser.parse_args()
+
+    store = MixerStore.load(args.store) if args.store and os.path.exists(args.store) else MixerStore()
+    if args.dir:
+        added = store.add_directory(args.dir)
+        print(f"{args.dir}: снимков {len(added)}")
+    for path in args.files:
+        added = store.add_file(path)
+        for index in added:
+            if store.parent[index] >= 0:
+                continue
+            source, stamp, mixer, expected = store.snapshots[index]
+            print(f"{path}: {stamp}, {mixer}, контролов {len(store.snapshot_rows(index))} из {expected}")
+        deltas = sum(1 for index in added if store.parent[index] >= 0)
+        if deltas:
+            print(f"{path}: изменений журнала {deltas}")
+    if args.store and (args.files or args.dir):
+        store.save(args.store)
+
+    def label(index):
+        source, stamp = store.snapshots[index][:2]
+        return f"{os.path.basename(source or '')} ({stamp})"
+
+    if args.diff:
+        for a in range(len(store.snapshots) - 1):
+            print(f"--- {label(a)}\n+++ {label(a + 1)}")
+            for kind, old, new in store.diff(a, a + 1):
+                print_change(kind, old, new)
+    elif args.changes:
+        for index, old, new in store.history(args.changes):
+            print(f"{label(index)}  ", end="")
+            print_change("changed", old, new)
+    elif args.matrix:
+        for a, row in enumerate(store.distances()):
+            print(" ".join(f"{d:4}" for d in row), f" {label(a)}")
+    elif args.find or args.id is not None or args.value:
+        started = time.perf_counter()
+        found = list(store.find(args.find, args.value, args.id))
+        elapsed = time.perf_counter() - started
+        for snapshot, control in found:
+            source, stamp = store.snapshots[snapshot][:2]
+            print(f"{stamp}  {os.path.basename(source or '')}  {control.id:4}  {control.name:40}  {control.text()}")
+        print(f"Найдено {len(found)} за {elapsed * 1e6:.0f} мкс", file=sys.stderr)
+    else:
+        malformed = sum(store.malformed)
+        print(f"Снимков {len(store.snapshots)}, строк {len(store.key)}, контролов {len(store.keys)}, "
+              f"неполных значений {malformed}")
+
+if __name__ == "__main__":
+    main()
@@ -1,50 +1,259 @@
 #!/usr/bin/env python3
+# Синхронизация с GitHub. Вместо `git add .` по всему дереву — только файлы,
+# у которых поменялись время или размер с прошлого запуска (состояние в .git),
+# pull только если на сервере что-то появилось, push только если есть что отправлять.
+# Частые запуски (виджет, auto_log.py) сливаются в одну синхронизацию:
+#   python sync.py              — синхронизировать сейчас
+#   python sync.py --quiet 30   — подождать 30 секунд тишины, собрав всё в один push
 import os
-import subprocess
+import sys
+import json
+import time
+import fcntl
+import argparse
 import datetime
+import subprocess
 
 # ПУТЬ К GIT В PYDROID 3
 GIT_PATH = "/data/data/ru.iiec.pydroid3/files/usr/bin/git"
 REPO_DIR = "/storage/emulated/0/pydroid/pydroid"
+REMOTE = "origin"
+BRANCH = "main"
+STATE_NAME = "sync_state.json"  # Время и размер файлов на момент прошлой синхронизации
+LOCK_NAME = "sync.lock"
+PENDING_NAME = "sync.pending"  # Запрос синхронизации, пришедший во время другой
+
+class SyncEngine:
+    def __init__(self, repo_dir=REPO_DIR, git=None, remote=REMOTE, branch=BRANCH):
+        self.repo_dir = os.path.abspath(repo_dir)
+        self.git_path = git or (GIT_PATH if os.path.exists(GIT_PATH) else "git")
+        self.remote = remote
+        self.branch = branch
+        self.git_dir = os.path.join(self.repo_dir, ".git")
+        self.state_path = os.path.join(self.git_dir, STATE_NAME)
+        self.calls = 0  # Сколько раз запускался git
+
+    def git(self, *args, input=None):
+        # (код возврата, вывод); ошибки git не исключение, а текст, как и раньше
+        self.calls += 1
+        try:
+            result = subprocess.run([self.git_path, "-C", self.repo_dir, *args], input=input,
+                                    capture_output=True, text=True, check=False)
+        except OSError as e:
+            return -1, f"Ошибка: {e}"
+        return result.returncode, result.stdout + result.stderr
+
+    def load_state(self):
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def save_state(self, state):
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, self.state_path)
+
+    def scan(self):
+        # {путь: [mtime_ns, размер]} по всем файлам рабочего дерева, без .git
+        files = {}
+        stack = [self.repo_dir]
+        while stack:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.name == ".git":
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        stat = entry.stat(follow_symlinks=False)
+                        path = os.path.relpath(entry.path, self.repo_dir).replace(os.sep, "/")
+                        files[path] = [stat.st_mtime_ns, stat.st_size]
+        return files
+
+    def changed_files(self, state, files):
+        # Новые, изменившиеся и удалённые с прошлого раза; без состояния — все
+        if state is None:
+            return sorted(files) + self.tracked_missing(files)
+        changed = [path for path, stat in files.items() if state.get(path) != stat]
+        changed.extend(path for path in state if path not in files)
+        return sorted(changed)
+
+    def tracked_missing(self, files):
+        code, output = self.git("ls-files", "-z")
+        if code != 0:
+            return []
+        return [path for path in output.split("\0") if path and path not in files]
 
-os.chdir(REPO_DIR)
+    def stage(self, paths):
+        # Один вызов git на всю пачку: пути через stdin, игнорируемые отсеиваются
+        # тоже одним вызовом (отслеживаемые файлы check-ignore не отсеивает, как
+        # и `git add .`). -A — чтобы удалённые файлы тоже попали в коммит
+        if not paths:
+            return []
+        _, ignored = self.git("check-ignore", "--stdin", "-z", input="\0".join(paths) + "\0")
+        ignored = set(ignored.split("\0"))
+        paths = [path for path in paths if path not in ignored]
+        # Удалённый файл, которого git не знает (не был добавлен или уже снят
+        # с учёта), add отвергает целиком: «pathspec did not match»
+        deleted = [path for path in paths if not os.path.lexists(os.path.join(self.repo_dir, path))]
+        if deleted:
+            code, output = self.git("--literal-pathspecs", "ls-files", "-z", "--", *deleted)
+            if code != 0:
+                raise RuntimeError(output)
+            unknown = set(deleted) - set(output.split("\0"))
+            paths = [path for path in paths if path not in unknown]
+        if paths:
+            code, output = self.git("--literal-pathspecs", "add", "-A", "--pathspec-from-file=-",
+                                    "--pathspec-file-nul", input="\0".join(paths) + "\0")
+            if code != 0:
+                raise RuntimeError(output)
+        return paths
 
-def run_git(cmd):
+    def remote_head(self):
+        code, output = self.git("ls-remote", self.remote, f"refs/heads/{self.branch}")
+        if code != 0:
+            raise RuntimeError(output)
+        return output.split()[0] if output.strip() else None
+
+    def local_ref(self, ref):
+        code, output = self.git("rev-parse", "--verify", "-q", ref)
+        return output.strip() if code == 0 else None
+
+    def pull(self):
+        # Пропускаем pull, если ветка на сервере уже есть в HEAD. По refs/remotes
+        # решать нельзя: неудачный pull успевает сделать fetch и сдвинуть его,
+        # и следующие запуски пропускали бы pull, а push отвергался бы навсегда
+        remote = self.remote_head()
+        if remote is None:
+            return None
+        code, _ = self.git("merge-base", "--is-ancestor", remote, "HEAD")
+        if code == 0:
+            return None
+        code, output = self.git("pull", "--no-edit", self.remote, self.branch)
+        if code != 0:
+            # Конфликт оставляет слияние недоделанным — откатываем, дерево как было
+            if os.path.exists(os.path.join(self.git_dir, "MERGE_HEAD")):
+                self.git("merge", "--abort")
+            raise RuntimeError(output)
+        return output
+
+    def commit(self, message):
+        # Коммит, только если в индексе что-то есть
+        code, _ = self.git("diff", "--cached", "--quiet")
+        if code == 0:
+            return None
+        code, output = self.git("commit", "-m", message)
+        if code != 0:
+            raise RuntimeError(output)
+        return output
+
+    def push(self):
+        # Push, только если локальная ветка ушла вперёд
+        head = self.local_ref("HEAD")
+        if head is None or head == self.local_ref(f"refs/remotes/{self.remote}/{self.branch}"):
+            return None
+        code, output = self.git("push", self.remote, f"HEAD:{self.branch}")
+        if code != 0:
+            raise RuntimeError(output)
+        # git обновляет refs/remotes сам, но не при push по URL без настроенного fetch
+        self.git("update-ref", f"refs/remotes/{self.remote}/{self.branch}", head)
+        return output
+
+    def sync(self, message=None):
+        # Одна синхронизация; возвращает отчёт для печати
+        report = {"pulled": False, "staged": 0, "committed": False, "pushed": False}
+        if self.pull() is not None:
+            report["pulled"] = True
+        state = self.load_state()
+        files = self.scan()
+        staged = self.stage(self.changed_files(state, files))
+        report["staged"] = len(staged)
+        message = message or f"Авто: {datetime.datetime.now().strftime('%d.%m %H:%M')}"
+        if self.commit(message) is not None:
+            report["committed"] = True
+        # Состояние сохраняем после коммита: упавший запуск повторит те же файлы
+        self.save_state(files)
+        if self.push() is not None:
+            report["pushed"] = True
+        report["git_calls"] = self.calls
+        return report
+
+def sync_coalesced(engine, quiet=0, message=None):
+    # Если синхронизация уже идёт, только оставляем ей запрос: она сделает ещё
+    # один проход и заберёт наши изменения. quiet — ждать столько секунд без новых
+    # запросов, чтобы пачка файлов ушла одним push
+    lock_path = os.path.join(engine.git_dir, LOCK_NAME)
+    pending_path = os.path.join(engine.git_dir, PENDING_NAME)
+    reports = []
+    requested = False
+    while True:
+        with open(lock_path, "a") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                if requested:
+                    return reports or None
+                with open(pending_path, "w") as f:
+                    f.write(str(time.time()))
+                # Ещё одна попытка: хозяин мог снять блокировку, не увидев запроса.
+                # Если она занята и теперь, хозяин увидит запрос после снятия
+                requested = True
+                continue
+            try:
+                while True:
+                    if quiet:
+                        while True:
+                            time.sleep(quiet)
+                            try:
+                                if time.time() - os.path.getmtime(pending_path) >= quiet:
+                                    break
+                            except FileNotFoundError:
+                                break
+                    try:
+                        os.remove(pending_path)
+                    except FileNotFoundError:
+                        pass
+                    reports.append(engine.sync(message))
+                    if not os.path.exists(pending_path):
+                        break
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        # Запрос мог прийти между последней проверкой и снятием блокировки
+        if not os.path.exists(pending_path):
+            return reports
+
+def main():
+    parser = argparse.ArgumentParser(description="Синхронизация с GitHub")
+    parser.add_argument("--repo", default=REPO_DIR, metavar="КАТАЛОГ")
+    parser.add_argument("--remote", default=REMOTE)
+    parser.add_argument("--branch", default=BRANCH)
+    parser.add_argument("--quiet", type=float, default=0, metavar="СЕКУНД",
+                        help="ждать, пока запросы не утихнут на столько секунд")
+    parser.add_argument("-m", "--message", help="сообщение коммита")
+    args = parser.parse_args()
+
+    print("СИНХРОНИЗАЦИЯ С GITHUB")
+    print(f"Время: {datetime.datetime.now().strftime('%H:%M:%S')}")
+    engine = SyncEngine(args.repo, remote=args.remote, branch=args.branch)
     try:
-        full_cmd = [GIT_PATH] + cmd.split()
-        result = subprocess.run(
-            full_cmd,
-            capture_output=True,
-            text=True,
-            check=False
-        )
-        return result.stdout + result.stderr
-    except Exception as e:
-        return f"Ошибка: {e}"
-
-print("СИНХРОНИЗАЦИЯ С GITHUB")
-print(f"Время: {datetime.datetime.now().strftime('%H:%M:%S')}")
-
-# 1. Pull
-print("\nЗагружаем с GitHub...")
-print(run_git("pull origin main"))
-
-# 2. Проверяем изменения
-status = run_git("status --porcelain")
-if not status.strip():
-    print("Нет новых файлов.")
-else:
-    print(f"Найдено изменений: {len(status.splitlines())}")
-    print("Добавляем...")
-    print(run_git("add ."))
-    
-    msg = f"Авто: {datetime.datetime.now().strftime('%d.%m %H:%M')}"
-    print(f"Коммит: {msg}")
-    commit_result = run_git(f'commit -m "{msg}"')
-    print(commit_result)
-    
-    print("Отправляем на GitHub...")
-    push_result = run_git("push origin main")
-    print(push_result)
-
-print("\nГОТОВО! Файлы на GitHub.")
\ No newline at end of file
+        reports = sync_coalesced(engine, args.quiet, args.message)
+    except RuntimeError as e:
+        sys.exit(f"Ошибка git:\n{e}")
+    if reports is None:
+        print("Синхронизация уже идёт — изменения попадут в неё.")
+        return
+    for report in reports:
+        print("Загружено с GitHub." if report["pulled"] else "На GitHub нового нет.")
+        if report["committed"]:
+            print(f"Найдено изменений, проверено файлов: {report['staged']}")
+        else:
+            print("Нет новых файлов.")
+        if report["pushed"]:
+            print("Отправлено на GitHub.")
+    print(f"\nГОТОВО! Вызовов git: {engine.calls}")
+
+if __name__ == "__main__":
+    main()
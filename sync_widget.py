@@ -1,4 +1,8 @@
 # sync_widget.py
 import os
-os.system("/storage/emulated/0/pydroid/pydroid/sync.sh")
-print("Синхронизация запущена!")
\ No newline at end of file
+import sys
+import subprocess
+
+# Частые нажатия сливаются в одну синхронизацию (ждём 5 секунд тишины)
+subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "sync.py"), "--quiet", "5"])
+print("Синхронизация запущена!")
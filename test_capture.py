@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+# Разбор потока событий capture.py:
+#   python -m unittest test_capture
+import unittest
+
+import capture
+
+NAMES = {"Audio IRQ1 CNT": 0, "Audio IRQ2 CNT": 1, "ANC Switch": 11}
+
+class ParseEventTest(unittest.TestCase):
+    def test_alsactl_monitor_line(self):
+        # numid 12 — это id 11 у tinymix, а не соседний контрол 12
+        line = "node hw:0, #12 (2,0,0,ANC Switch,0) VALUE\n"
+        self.assertEqual(capture.parse_event(line, NAMES), (11, None))
+
+    def test_old_monitor_line(self):
+        self.assertEqual(capture.parse_event("#2 (2,0,0,Audio IRQ2 CNT,0) VALUE", NAMES), (1, None))
+
+    def test_unknown_name_uses_numid(self):
+        line = "node hw:0, #40 (2,0,0,Other, with comma,0) VALUE"
+        self.assertEqual(capture.parse_event(line, NAMES), (39, None))
+
+    def test_own_events(self):
+        self.assertEqual(capture.parse_event("12 On\n", NAMES), (12, "On"))
+        self.assertEqual(capture.parse_event("12", NAMES), (12, None))
+
+    def test_not_an_event(self):
+        self.assertIsNone(capture.parse_event("Ready to listen...", NAMES))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# Проверка sync.py на локальном bare-репозитории вместо GitHub:
+#   python -m unittest test_sync
+import os
+import shutil
+import tempfile
+import threading
+import subprocess
+import unittest
+
+import sync
+
+def git(repo, *args):
+    result = subprocess.run(["git", "-C", repo, *args], capture_output=True, text=True, check=True)
+    return result.stdout
+
+def write(repo, path, text):
+    full = os.path.join(repo, path)
+    os.makedirs(os.path.dirname(full), exist_ok=True)
+    with open(full, "w") as f:
+        f.write(text)
+
+@unittest.skipUnless(shutil.which("git"), "нет git")
+class SyncTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.remote = os.path.join(self.root, "remote.git")
+        subprocess.run(["git", "init", "-q", "--bare", "-b", sync.BRANCH, self.remote], check=True)
+        self.repo = self.clone("a")
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def clone(self, name):
+        repo = os.path.join(self.root, name)
+        subprocess.run(["git", "clone", "-q", self.remote, repo], capture_output=True, check=True)
+        git(repo, "config", "user.name", "sync")
+        git(repo, "config", "user.email", "sync@localhost")
+        git(repo, "config", "commit.gpgsign", "false")
+        return repo
+
+    def engine(self, repo=None):
+        return sync.SyncEngine(repo or self.repo, git="git")
+
+    def remote_files(self):
+        return sorted(git(self.remote, "ls-tree", "-r", "--name-only", sync.BRANCH).split())
+
+    def remote_commits(self):
+        return int(git(self.remote, "rev-list", "--count", sync.BRANCH))
+
+    def test_first_sync(self):
+        write(self.repo, "f.txt", "1")
+        write(self.repo, "d/g.txt", "2")
+        write(self.repo, ".gitignore", "*.log\n")
+        write(self.repo, "skip.log", "3")
+        report = self.engine().sync()
+        self.assertTrue(report["committed"])
+        self.assertTrue(report["pushed"])
+        self.assertEqual(self.remote_files(), [".gitignore", "d/g.txt", "f.txt"])
+
+    def test_noop_sync(self):
+        write(self.repo, "f.txt", "1")
+        self.engine().sync()
+        engine = self.engine()
+        report = engine.sync()
+        self.assertFalse(report["pulled"] or report["committed"] or report["pushed"])
+        self.assertEqual(report["staged"], 0)
+        # ls-remote, merge-base, diff --cached, rev-parse HEAD, rev-parse origin
+        self.assertEqual(engine.calls, 5)
+
+    def test_incremental_change(self):
+        write(self.repo, "f.txt", "1")
+        write(self.repo, "g.txt", "2")
+        self.engine().sync()
+        write(self.repo, "f.txt", "changed")
+        report = self.engine().sync()
+        self.assertEqual(report["staged"], 1)
+        self.assertEqual(git(self.remote, "show", f"{sync.BRANCH}:f.txt"), "changed")
+        self.assertEqual(self.remote_commits(), 2)
+
+    def test_tracked_file_matching_gitignore(self):
+        write(self.repo, "data.log", "1")
+        self.engine().sync()
+        write(self.repo, ".gitignore", "*.log\n")
+        write(self.repo, "data.log", "changed")
+        write(self.repo, "new.log", "skip")
+        self.engine().sync()
+        self.assertEqual(self.remote_files(), [".gitignore", "data.log"])
+        self.assertEqual(git(self.remote, "show", f"{sync.BRANCH}:data.log"), "changed")
+
+    def test_deletion(self):
+        write(self.repo, "f.txt", "1")
+        write(self.repo, "g.txt", "2")
+        self.engine().sync()
+        os.remove(os.path.join(self.repo, "g.txt"))
+        self.engine().sync()
+        self.assertEqual(self.remote_files(), ["f.txt"])
+
+    def test_deleted_untracked_file(self):
+        write(self.repo, "f.txt", "1")
+        write(self.repo, "u.txt", "2")
+        self.engine().sync()
+        git(self.repo, "rm", "-q", "--cached", "u.txt")
+        os.remove(os.path.join(self.repo, "u.txt"))
+        self.engine().sync()
+        self.assertEqual(self.remote_files(), ["f.txt"])
+        self.assertEqual(self.engine().sync()["staged"], 0)
+
+    def test_pull_remote_changes(self):
+        write(self.repo, "f.txt", "1")
+        self.engine().sync()
+        other = self.clone("b")
+        write(other, "h.txt", "2")
+        self.engine(other).sync()
+        report = self.engine().sync()
+        self.assertTrue(report["pulled"])
+        self.assertFalse(report["pushed"])
+        self.assertTrue(os.path.exists(os.path.join(self.repo, "h.txt")))
+
+    def test_recover_after_failed_pull(self):
+        write(self.repo, "f.txt", "1")
+        self.engine().sync()
+        other = self.clone("b")
+        write(other, "h.txt", "remote")
+        self.engine(other).sync()
+        # Неотслеживаемый h.txt мешает слиянию: pull падает, но fetch уже прошёл
+        write(self.repo, "h.txt", "local")
+        write(self.repo, "g.txt", "2")
+        with self.assertRaises(RuntimeError):
+            self.engine().sync()
+        os.remove(os.path.join(self.repo, "h.txt"))
+        report = self.engine().sync()
+        self.assertTrue(report["pulled"])
+        self.assertTrue(report["pushed"])
+        self.assertEqual(self.remote_files(), ["f.txt", "g.txt", "h.txt"])
+
+    def test_coalesced_triggers(self):
+        write(self.repo, "f.txt", "0")
+        self.engine().sync()
+        started = threading.Event()
+        release = threading.Event()
+        results = []
+        write(self.repo, "c1.txt", "1")
+        first = threading.Thread(target=lambda: results.append(
+            sync.sync_coalesced(HeldEngine(self.repo, started, release))))
+        first.start()
+        started.wait()
+        # Пока первая синхронизация держит блокировку, запуски только оставляют запрос
+        for name in ("c2.txt", "c3.txt"):
+            write(self.repo, name, name)
+            self.assertIsNone(sync.sync_coalesced(self.engine()))
+        release.set()
+        first.join()
+        self.assertFalse(os.path.exists(os.path.join(self.repo, ".git", sync.PENDING_NAME)))
+        self.assertEqual(self.remote_commits(), 2)
+        self.assertEqual(self.remote_files(), ["c1.txt", "c2.txt", "c3.txt", "f.txt"])
+        self.assertEqual(sum(report["pushed"] for report in results[0]), 1)
+
+class HeldEngine(sync.SyncEngine):
+    # Синхронизация, которая ждёт release, уже взяв блокировку
+    def __init__(self, repo, started, release):
+        super().__init__(repo, git="git")
+        self.started = started
+        self.release = release
+
+    def sync(self, message=None):
+        self.started.set()
+        self.release.wait()
+        return super().sync(message)
+
+if __name__ == "__main__":
+    unittest.main()
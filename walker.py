@@ -0,0 +1,1979 @@
+# Модель: физика существ, мозг, геном, эволюция и сохранения.
+# Не зависит от pygame и экрана, поэтому импортируется быстро: её используют
+# headless-запуск, процессы оценки и замеры. Экран подключает 1.py
+import os
+import math
+import time
+import random
+import hashlib
+import pickle
+import zlib
+import json
+import csv
+import queue
+import statistics
+import threading
+import multiprocessing
+from collections import OrderedDict
+from array import array
+from multiprocessing.connection import Listener, Client
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # Без numpy работает только обычная (объектная) физика
+
+# Цвета
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+RED = (255, 50, 50)
+BLUE = (50, 50, 255)
+GREEN = (50, 255, 50)
+YELLOW = (255, 255, 50)
+ORANGE = (255, 150, 50)
+PURPLE = (150, 50, 255)
+BROWN = (120, 70, 30)
+GRAY = (150, 150, 150)
+
+# Размер мира без экрана; с экраном 1.py берёт размер дисплея
+DEFAULT_WIDTH, DEFAULT_HEIGHT = 1280, 800
+
+class Config:
+    # Размеры мира и зависящие от них константы. Всё масштабируется от стороны 800
+    def __init__(self, width=DEFAULT_WIDTH, height=DEFAULT_HEIGHT):
+        self.width = width
+        self.height = height
+        self.scale = min(width, height) / 800
+        self.point_radius = int(10 * self.scale)
+        self.gravity = 0.5 * self.scale
+        self.min_muscle_length = 40 * self.scale
+        self.max_muscle_length = 180 * self.scale
+        self.ground_y = height * 0.8  # Верх земли, которую рисует draw_ground
+        
+    def key(self):
+        # Входит в ключ кеша фитнеса: один геном в разных мирах ходит по-разному
+        return f"{self.width}x{self.height}"
+
+def configure(config):
+    # Физика читает константы модуля (так быстрее атрибутов), configure их выставляет.
+    # Вызывать до создания существ; процессы оценки наследуют настройку при fork
+    global CONFIG, WIDTH, HEIGHT, SCALE, POINT_RADIUS, GRAVITY, MIN_MUSCLE_LENGTH, MAX_MUSCLE_LENGTH, GROUND_Y
+    CONFIG = config
+    WIDTH, HEIGHT = config.width, config.height
+    SCALE = config.scale
+    POINT_RADIUS = config.point_radius
+    GRAVITY = config.gravity
+    MIN_MUSCLE_LENGTH = config.min_muscle_length
+    MAX_MUSCLE_LENGTH = config.max_muscle_length
+    GROUND_Y = config.ground_y
+
+configure(Config())
+
+# Физика
+FRICTION = 0.99
+MUSCLE_STRENGTH = 0.5
+STIFFNESS = 0.4
+
+# Решатель на ограничениях (engine="pbd")
+PBD_ITERATIONS = 4  # Проходов проекции за тик
+PBD_RELAXATION = 1.5  # Перерелаксация усреднённых поправок Якоби
+PBD_DT = 0.1  # Шаг, с которым pbd остаётся устойчивым: вдвое меньше тиков, чем при SIM_DT
+GROUND_FRICTION = 0.5  # Доля скольжения по земле, гасимая за тик длиной SIM_DT
+
+# Мозг
+COMMAND_PATTERNS = [
+    [True, False, True, False],
+    [False, True, False, True],
+    [True, True, False, False],
+    [False, False, True, True],
+    [True, False, False, True]
+]
+ACTIONS_PER_COMMAND = 4
+POINT_COLORS = [YELLOW, BLUE, GREEN, ORANGE, PURPLE]
+FLIP_CHANCE = 0.05  # Вероятность, что мышца ослушается команды на этом тике
+
+# Случайность отрисовки (цвета, мерцание) берётся отдельно и не влияет на симуляцию
+render_random = random.Random()
+
+# Оценка поколения
+RECORD_FIELDS = ("time_alive", "center_x", "center_y", "velocity", "energy", "distance_traveled", "fitness")
+FITNESS_VERSION = 4  # Меняется вместе с формулой фитнеса, чтобы старый кеш не подмешивался
+SIM_DT = 0.05  # Шаг симуляции при скорости 1x
+MAX_LIFETIME = 10  # Секунд симуляции на одно существо
+VELOCITY_MIN_TIME = 1.0  # Секунд: меньшее время жизни в средней скорости не учитывается
+
+# Сохранение прогресса
+CHECKPOINT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "evolution.ckpt")
+CHECKPOINT_EVERY = 5  # Поколений между сохранениями
+
+# Повторы чемпионов (см. ReplayRecorder)
+REPLAY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "replays")
+REPLAY_QUANTUM = 1 / 16  # Шаг смещений точек от центра: int16 покрывает ±2048 px
+
+# Острова
+MIGRATE_EVERY = 5  # Поколений между обменами
+MIGRANTS = 2  # Сколько лучших геномов уплывает к соседу
+ISLAND_AUTHKEY = b"walker-islands"  # Для соединений между машинами
+
+# Телеметрия: одна плоская запись на поколение (см. Telemetry)
+TELEMETRY_PHASES = ("brain", "physics", "fitness", "crossover", "render")
+TELEMETRY_FIELDS = (
+    "generation", "time", "population", "evaluated", "ticks", "eval_sec", "ticks_per_sec",
+    "best_fitness", "mean_fitness", "median_fitness", "record",
+    "points_mean", "points_max", "muscles_mean", "muscles_max", "commands_mean",
+    "cache_hit_rate",
+) + tuple(f"{phase}_sec" for phase in TELEMETRY_PHASES)
+
+class Point:
+    def __init__(self, x, y, fixed=False, color=YELLOW):
+        self.x = x
+        self.y = y
+        self.prev_x = x
+        self.prev_y = y
+        self.fixed = fixed
+        self.radius = POINT_RADIUS
+        self.mass = 1.0
+        self.color = RED if fixed else color
+        self.highlight = False
+        self.id = id(self)  # Уникальный идентификатор на основе id объекта
+        
+    def __hash__(self):
+        return self.id  # Делаем объект хешируемым
+        
+    def __eq__(self, other):
+        return self.id == other.id
+        
+    def update(self, dt):
+        if not self.fixed:
+            temp_x, temp_y = self.x, self.y
+            vel_x = (self.x - self.prev_x) * FRICTION
+            vel_y = (self.y - self.prev_y) * FRICTION
+            
+            self.x += vel_x
+            self.y += vel_y + GRAVITY * dt * 50
+            
+            self.prev_x, self.prev_y = temp_x, temp_y
+            
+            self.x = max(self.radius, min(WIDTH-self.radius, self.x))
+            self.y = max(self.radius, min(HEIGHT-self.radius, self.y))
+
+class Muscle:
+    def __init__(self, point1, point2, strength_mult=1.0, phase=None, speed=None, rng=random):
+        self.point1 = point1
+        self.point2 = point2
+        self.rest_length = self.get_length()
+        self.target_length = self.rest_length
+        self.contracting = False
+        self.base_strength = MUSCLE_STRENGTH * strength_mult
+        self.strength = self.base_strength
+        self.phase = rng.random() * 2 * math.pi if phase is None else phase
+        self.speed = rng.uniform(0.5, 1.5) if speed is None else speed
+        self.length = self.rest_length  # Длина, измеренная в последнем update
+        self.color = BLUE
+        self.highlight = False
+        
+    def get_length(self):
+        dx = self.point2.x - self.point1.x
+        dy = self.point2.y - self.point1.y
+        return math.sqrt(dx*dx + dy*dy)
+        
+    def update(self, dt):
+        if self.contracting:
+            self.target_length = max(MIN_MUSCLE_LENGTH, self.rest_length * (0.6 + 0.1*math.sin(self.phase)))
+        else:
+            self.target_length = min(MAX_MUSCLE_LENGTH, self.rest_length * (1.0 + 0.2*math.sin(self.phase*0.5)))
+            
+        self.phase += dt * self.speed
+        
+        current_length = self.get_length()
+        self.length = current_length
+        if current_length == 0:
+            return
+            
+        dx = self.point2.x - self.point1.x
+        dy = self.point2.y - self.point1.y
+        direction_x = dx / current_length
+        direction_y = dy / current_length
+        
+        force = (current_length - self.target_length) * self.strength
+        
+        if not self.point1.fixed:
+            self.point1.x += direction_x * force * dt * 50 / self.point1.mass
+            self.point1.y += direction_y * force * dt * 50 / self.point1.mass
+            
+        if not self.point2.fixed:
+            self.point2.x -= direction_x * force * dt * 50 / self.point2.mass
+            self.point2.y -= direction_y * force * dt * 50 / self.point2.mass
+            
+        stiffness_force = (current_length - self.rest_length) * STIFFNESS
+        
+        if not self.point1.fixed:
+            self.point1.x += direction_x * stiffness_force * dt * 30
+            self.point1.y += direction_y * stiffness_force * dt * 30
+            
+        if not self.point2.fixed:
+            self.point2.x -= direction_x * stiffness_force * dt * 30
+            self.point2.y -= direction_y * stiffness_force * dt * 30
+            
+        if self.contracting:
+            self.color = GREEN
+        else:
+            ratio = current_length / self.rest_length if self.rest_length else 1.0
+            self.color = ORANGE if ratio > 1.2 else PURPLE if ratio < 0.8 else BLUE
+
+class Creature:
+    def __init__(self, points, muscles, commands=None, seed=None):
+        self.points = points
+        self.muscles = muscles
+        self.position = self.center()
+        self.time_alive = 0
+        self.distance_traveled = 0
+        self.velocity = 0
+        self.fitness = 0
+        self.energy = 100
+        self.age = 0
+        self.color = (
+            render_random.randint(100, 255),
+            render_random.randint(100, 255),
+            render_random.randint(100, 255)
+        )
+        self.brain = self.Brain(len(muscles), commands, seed)
+        self.initial_state = None
+        
+    def restore_body(self):
+        # Возвращаем точки и мышцы в положение до симуляции
+        if self.initial_state is None:
+            self.initial_state = (
+                [(p.x, p.y) for p in self.points],
+                [m.phase for m in self.muscles]
+            )
+            return
+            
+        positions, phases = self.initial_state
+        for point, (x, y) in zip(self.points, positions):
+            point.x = point.prev_x = x
+            point.y = point.prev_y = y
+        for muscle, phase in zip(self.muscles, phases):
+            muscle.phase = phase
+            muscle.target_length = muscle.rest_length
+            muscle.contracting = False
+            
+    def center(self):
+        # Центр масс; один проход по точкам вместо двух sum()
+        sum_x = sum_y = 0.0
+        for point in self.points:
+            sum_x += point.x
+            sum_y += point.y
+        n = len(self.points)
+        return [sum_x / n, sum_y / n]
+        
+    def record(self):
+        # Запись тика для потока stream(), поля в порядке RECORD_FIELDS
+        return (self.time_alive, self.position[0], self.position[1], self.velocity,
+                self.energy, self.distance_traveled, self.fitness)
+        
+    def reset(self):
+        self.restore_body()
+        self.position = self.center()
+        self.velocity = 0
+        self.time_alive = 0
+        self.distance_traveled = 0
+        self.fitness = 0
+        self.energy = 100
+        self.age = 0
+        self.brain.current_command = 0
+        self.brain.command_timer = 0
+        self.brain.tick = 0
+        
+    class Brain:
+        # Программа мозга скомпилирована в таблицы: actions — ACTIONS_PER_COMMAND флагов
+        # на команду подряд (как в Genome), durations — длительности команд.
+        # Мышца i в команде k берёт флаг actions[k*ACTIONS_PER_COMMAND + i % ACTIONS_PER_COMMAND]
+        def __init__(self, num_muscles, commands=None, seed=None):
+            self.num_muscles = num_muscles
+            self.actions = bytearray()
+            self.durations = array('i')
+            self.current_command = 0
+            self.command_timer = 0
+            # Случайные срывы команд зависят только от seed'а и номера тика
+            self.seed = random.getrandbits(64) if seed is None else seed
+            self.tick = 0
+            if commands is None:
+                commands = random_commands(random)
+            for actions, duration in commands:
+                self.actions.extend(bool(a) for a in actions)
+                self.durations.append(duration)
+            # Состояния всех мышц для каждой команды, собираются при первом обращении
+            self.patterns = [None] * len(self.durations)
+            
+        @property
+        def num_commands(self):
+            return len(self.durations)
+            
+        def pattern(self, k):
+            pattern = self.patterns[k]
+            if pattern is None:
+                n = ACTIONS_PER_COMMAND
+                flags = [bool(a) for a in self.actions[k*n:(k+1)*n]]
+                pattern = self.patterns[k] = [flags[i % n] for i in range(self.num_muscles)]
+            return pattern
+        
+        def decide(self, contracting, dt, draws=None):
+            # Новое состояние мышц по текущей команде; общая часть для объектов и массивов.
+            # draws — случайные числа этого тика, если их уже посчитали пачкой
+            if self.current_command >= self.num_commands:
+                self.current_command = 0
+            
+            if draws is None:
+                draws = [noise(self.seed, (self.tick << 32) + i) for i in range(len(contracting))]
+            
+            states = [
+                (not state) if draw < FLIP_CHANCE else action
+                for state, draw, action in zip(contracting, draws, self.pattern(self.current_command))
+            ]
+            
+            self.tick += 1
+            
+            self.command_timer += dt * 60
+            if self.command_timer >= self.durations[self.current_command]:
+                self.current_command = (self.current_command + 1) % self.num_commands
+                self.command_timer = 0
+            return states
+        
+        def update(self, creature, dt):
+            states = self.decide([m.contracting for m in creature.muscles], dt)
+            for muscle, state in zip(creature.muscles, states):
+                muscle.contracting = state
+        
+    def update(self, dt):
+        # Тик из трёх фаз: мозг, физика, фитнес. По отдельности их зовёт timed_update
+        self.think(dt)
+        return self.score(self.move(dt), dt)
+        
+    def think(self, dt):
+        self.brain.update(self, dt)
+        
+    def move(self, dt):
+        # Возвращает суммарное растяжение мышц, измеренное в Muscle.update
+        for point in self.points:
+            point.update(dt)
+        
+        stretch = 0.0
+        for muscle in self.muscles:
+            muscle.update(dt)
+            stretch += abs(muscle.length - muscle.rest_length)
+        return stretch
+        
+    def score(self, stretch, dt):
+        # Фитнес собирается из того, что уже посчитала физика: длины мышц
+        # берутся из Muscle.update, центр — за один проход по точкам
+        self.time_alive += dt
+        self.age += dt * 0.01
+        self.energy -= stretch * 0.001 * dt
+        
+        center_x, center_y = self.center()
+        self.distance_traveled, self.velocity, self.fitness = fitness_terms(
+            center_x, center_y, self.position[0], self.time_alive, self.energy, self.age, dt)
+        self.position = [center_x, center_y]
+        return center_x
+
+MASK64 = (1 << 64) - 1
+
+def noise(key, counter):
+    # splitmix64: число из [0, 1), которое зависит только от (key, counter).
+    # Так поток случайности у каждого существа свой и не зависит от того,
+    # в каком процессе или в какой пачке его считают
+    z = (key + (counter + 1) * 0x9E3779B97F4A7C15) & MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK64
+    z ^= z >> 31
+    return (z >> 11) * (1.0 / (1 << 53))
+
+def noise_array(keys, counters):
+    # То же, что noise(), для массивов uint64 — бит в бит
+    z = keys + (counters + np.uint64(1)) * np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    z ^= z >> np.uint64(31)
+    return (z >> np.uint64(11)).astype(float) * (1.0 / (1 << 53))
+
+def muscle_waves(first, second):
+    # Muscle.update двигает точки по очереди, и каждая мышца видит поправки предыдущих.
+    # Раскладываем мышцы на волны без общих точек: волны идут по порядку, а внутри
+    # волны мышцы независимы, поэтому результат совпадает с последовательным обходом
+    level = {}
+    waves = []
+    for k, (a, b) in enumerate(zip(first, second)):
+        wave = max(level.get(a, 0), level.get(b, 0))
+        level[a] = level[b] = wave + 1
+        if wave == len(waves):
+            waves.append([])
+        waves[wave].append(k)
+    return [np.array(w, dtype=np.intp) for w in waves]
+
+def muscle_lengths(pos, first, second):
+    d = pos[second] - pos[first]
+    return np.sqrt(d[:, 0]*d[:, 0] + d[:, 1]*d[:, 1])
+
+def verlet_step(pos, prev, radius, moving, dt):
+    # Point.update для массива точек; возвращает новые pos и prev
+    vel = (pos - prev) * FRICTION
+    new = np.empty_like(pos)
+    new[:, 0] = pos[:, 0] + vel[:, 0]
+    new[:, 1] = pos[:, 1] + (vel[:, 1] + GRAVITY * dt * 50)
+    
+    new[:, 0] = np.maximum(radius, np.minimum(WIDTH - radius, new[:, 0]))
+    new[:, 1] = np.maximum(radius, np.minimum(HEIGHT - radius, new[:, 1]))
+    
+    moving = moving[:, None]
+    return np.where(moving, new, pos), np.where(moving, pos, prev)
+
+def muscle_targets(rest_length, phase, contracting):
+    # Целевые длины из Muscle.update; от положения точек не зависят
+    contracted = np.maximum(MIN_MUSCLE_LENGTH, rest_length * (0.6 + 0.1*np.sin(phase)))
+    relaxed = np.minimum(MAX_MUSCLE_LENGTH, rest_length * (1.0 + 0.2*np.sin(phase*0.5)))
+    return np.where(contracting, contracted, relaxed)
+
+def relax_muscles(pos, first, second, waves, target_length, rest_length, strength, inv_mass, movable, dt):
+    # Поправки Muscle.update волна за волной; inv_mass и movable равны 0 у неподвижных точек.
+    # Возвращает длины мышц, измеренные перед их поправкой (как Muscle.length)
+    lengths = np.empty(len(first))
+    for wave in waves:
+        i, j = first[wave], second[wave]
+        d = pos[j] - pos[i]
+        length = np.sqrt(d[:, 0]*d[:, 0] + d[:, 1]*d[:, 1])
+        lengths[wave] = length
+        # Мышца нулевой длины ничего не двигает, как и в Muscle.update
+        direction = d / np.where(length != 0, length, np.inf)[:, None]
+        
+        force = (length - target_length[wave]) * strength[wave]
+        stiffness_force = (length - rest_length[wave]) * STIFFNESS
+        push = direction * force[:, None] * dt * 50
+        pull = direction * stiffness_force[:, None] * dt * 30
+        
+        pos[i] = (pos[i] + push * inv_mass[i][:, None]) + pull * movable[i][:, None]
+        pos[j] = (pos[j] - push * inv_mass[j][:, None]) - pull * movable[j][:, None]
+    return lengths
+
+def pbd_step(pos, prev, radius, moving, first, second, degree, target_length, rest_length, strength,
+             inv_mass, dt, iterations=PBD_ITERATIONS):
+    # Position-based dynamics: сначала предсказываем положения по инерции и тяжести,
+    # потом iterations раз проецируем все мышцы сразу (Якоби: поправки каждой точки
+    # усредняются по её мышцам) и выталкиваем точки из земли. Скорость остаётся
+    # в разнице pos - prev, как у verlet_step. Константы пересчитаны на длину шага,
+    # поэтому крупный dt даёт то же движение за секунду, а не ускоряет его.
+    # Возвращает новые pos, prev и длины мышц последнего прохода
+    if iterations < 1:
+        raise ValueError(f"Нужен хотя бы один проход PBD, а не {iterations}")
+    ratio = dt / SIM_DT
+    guess = pos + (pos - prev) * FRICTION ** ratio
+    guess[:, 1] += GRAVITY * 50 * SIM_DT * ratio * ratio  # = GRAVITY * dt * 50 при dt = SIM_DT
+    
+    # Muscle.update тянет к целевой длине с силой strength и к исходной с STIFFNESS;
+    # здесь это одно ограничение к их взвешенной длине
+    weight = strength + STIFFNESS
+    goal = (strength * target_length + STIFFNESS * rest_length) / weight
+    stiffness = 1 - (1 - np.minimum(weight, 1.0)) ** (ratio / iterations)
+    
+    w1, w2 = inv_mass[first], inv_mass[second]
+    total = w1 + w2
+    scale = stiffness / np.where(total > 0, total, np.inf)
+    low = radius
+    high_x = WIDTH - radius
+    high_y = GROUND_Y - radius
+    n = len(pos)
+    for _ in range(iterations):
+        d = guess[second] - guess[first]
+        length = np.sqrt(d[:, 0]*d[:, 0] + d[:, 1]*d[:, 1])
+        correction = d * ((length - goal) * scale / np.where(length > 0, length, np.inf))[:, None]
+        for axis in (0, 1):
+            delta = (np.bincount(first, correction[:, axis] * w1, n)
+                     - np.bincount(second, correction[:, axis] * w2, n))
+            guess[:, axis] += PBD_RELAXATION * delta / degree
+        guess[:, 0] = np.maximum(low, np.minimum(high_x, guess[:, 0]))
+        guess[:, 1] = np.maximum(low, np.minimum(high_y, guess[:, 1]))
+    
+    # Трение: у точек на земле гасим часть горизонтального сдвига за тик
+    contact = guess[:, 1] >= high_y
+    grip = 1 - (1 - GROUND_FRICTION) ** ratio
+    guess[:, 0] -= np.where(contact, (guess[:, 0] - pos[:, 0]) * grip, 0.0)
+    
+    moving = moving[:, None]
+    return np.where(moving, guess, pos), np.where(moving, pos, prev), length
+
+def fitness_terms(center_x, center_y, prev_x, time_alive, energy, age, dt):
+    # Формула фитнеса; работает и с числами, и с массивами.
+    # velocity — мгновенная, по центру на прошлом тике (prev_x), она идёт в record().
+    # В фитнес — средняя за жизнь: мгновенная у Verlet на последнем тике бывает
+    # огромной, если тело численно разлетается. Первую секунду делим на секунду,
+    # чтобы смещение старта не раздувало скорость
+    distance_traveled = center_x - WIDTH//2
+    velocity = (center_x - prev_x) / dt if dt > 0 else center_x * 0
+    arrays = np is not None and isinstance(center_x, np.ndarray)
+    if arrays:
+        average = distance_traveled / np.maximum(time_alive, VELOCITY_MIN_TIME)
+    else:
+        average = distance_traveled / max(time_alive, VELOCITY_MIN_TIME)
+    height_penalty = abs(center_y - HEIGHT//2) * 0.2
+    energy_bonus = energy * 0.01
+    fitness = (
+        distance_traveled * 0.2 + 
+        average * 3 - 
+        height_penalty + 
+        energy_bonus -
+        age
+    )
+    # Мышцы точки не ограничивают, поэтому разлетевшееся тело уходит за край мира
+    # или в inf/nan. Такое существо получает фитнес ниже любого оставшегося в мире
+    lost_fitness = -2 * (WIDTH + HEIGHT)
+    if arrays:
+        inside = (center_x >= 0) & (center_x <= WIDTH) & (center_y >= 0) & (center_y <= HEIGHT)
+        fitness = np.where(inside & np.isfinite(fitness), fitness, lost_fitness)
+    elif not (0 <= center_x <= WIDTH and 0 <= center_y <= HEIGHT and math.isfinite(fitness)):
+        fitness = lost_fitness
+    return distance_traveled, velocity, fitness
+
+class ArrayCreature:
+    # Та же физика, что у Point/Muscle, но все точки и мышцы существа лежат в массивах
+    def __init__(self, creature):
+        if np is None:
+            raise ImportError("Для ArrayCreature нужен numpy")
+        self.creature = creature
+        self.brain = creature.brain
+        
+        points = creature.points
+        index = {p: i for i, p in enumerate(points)}
+        self.pos = np.array([(p.x, p.y) for p in points], dtype=float)
+        self.prev = np.array([(p.prev_x, p.prev_y) for p in points], dtype=float)
+        self.mass = np.array([p.mass for p in points], dtype=float)
+        self.radius = np.array([p.radius for p in points], dtype=float)
+        self.movable = np.array([not p.fixed for p in points])
+        self.inv_mass = self.movable / self.mass  # 0 для закреплённых точек
+        
+        muscles = creature.muscles
+        self.first = np.array([index[m.point1] for m in muscles], dtype=np.intp)
+        self.second = np.array([index[m.point2] for m in muscles], dtype=np.intp)
+        self.rest_length = np.array([m.rest_length for m in muscles], dtype=float)
+        self.target_length = np.array([m.target_length for m in muscles], dtype=float)
+        self.strength = np.array([m.strength for m in muscles], dtype=float)
+        self.phase = np.array([m.phase for m in muscles], dtype=float)
+        self.speed = np.array([m.speed for m in muscles], dtype=float)
+        self.contracting = np.array([m.contracting for m in muscles], dtype=bool)
+        self.waves = muscle_waves(self.first.tolist(), self.second.tolist())
+        
+        self.position = list(creature.position)
+        self.time_alive = creature.time_alive
+        self.distance_traveled = creature.distance_traveled
+        self.velocity = creature.velocity
+        self.fitness = creature.fitness
+        self.energy = creature.energy
+        self.age = creature.age
+        
+    def update(self, dt):
+        # Повторяет Creature.update шаг в шаг
+        self.think(dt)
+        return self.score(self.move(dt), dt)
+        
+    def think(self, dt):
+        self.contracting = np.array(self.brain.decide(self.contracting.tolist(), dt), dtype=bool)
+        
+    def move(self, dt):
+        self.pos, self.prev = verlet_step(self.pos, self.prev, self.radius, self.movable, dt)
+        
+        self.target_length = muscle_targets(self.rest_length, self.phase, self.contracting)
+        self.phase += dt * self.speed
+        return relax_muscles(self.pos, self.first, self.second, self.waves, self.target_length,
+                             self.rest_length, self.strength, self.inv_mass, self.movable, dt)
+        
+    def score(self, lengths, dt):
+        self.time_alive += dt
+        self.age += dt * 0.01
+        self.energy -= float(np.abs(lengths - self.rest_length).sum()) * 0.001 * dt
+        
+        center_x, center_y = self.pos.mean(axis=0).tolist()
+        self.distance_traveled, self.velocity, self.fitness = fitness_terms(
+            center_x, center_y, self.position[0], self.time_alive, self.energy, self.age, dt)
+        self.position = [center_x, center_y]
+        return center_x
+        
+    def record(self):
+        return (self.time_alive, self.position[0], self.position[1], self.velocity,
+                self.energy, self.distance_traveled, self.fitness)
+        
+    def write_back(self):
+        # Переносим состояние обратно в объекты, например для отрисовки
+        creature = self.creature
+        for point, (x, y), (px, py) in zip(creature.points, self.pos.tolist(), self.prev.tolist()):
+            point.x, point.y = x, y
+            point.prev_x, point.prev_y = px, py
+        for k, muscle in enumerate(creature.muscles):
+            muscle.phase = float(self.phase[k])
+            muscle.target_length = float(self.target_length[k])
+            muscle.contracting = bool(self.contracting[k])
+        creature.position = list(self.position)
+        creature.time_alive = self.time_alive
+        creature.distance_traveled = self.distance_traveled
+        creature.velocity = self.velocity
+        creature.fitness = self.fitness
+        creature.energy = self.energy
+        creature.age = self.age
+
+class PopulationArrays:
+    # Всё поколение в общих массивах: точки и мышцы существ идут подряд,
+    # а столбцы point_owner / muscle_owner говорят, чьи они.
+    # Один вызов update() продвигает всех живых существ на один тик.
+    # solver: "verlet" — та же физика, что у Point/Muscle, "pbd" — pbd_step с землёй
+    def __init__(self, creatures, solver="verlet", iterations=PBD_ITERATIONS):
+        if np is None:
+            raise ImportError("Для PopulationArrays нужен numpy")
+        self.creatures = list(creatures)
+        if iterations < 1:
+            raise ValueError(f"Нужен хотя бы один проход PBD, а не {iterations}")
+        self.solver = solver
+        self.iterations = iterations
+        self.brains = [c.brain for c in self.creatures]
+        self.point_colors = [p.color for c in self.creatures for p in c.points]  # Только для отрисовки
+        n = len(self.creatures)
+        
+        coords, prev, mass, radius, movable, point_owner = [], [], [], [], [], []
+        first, second, rest, strength, phase, speed, muscle_owner = [], [], [], [], [], [], []
+        waves = []
+        point_start, muscle_start = [0], [0]
+        for c, creature in enumerate(self.creatures):
+            offset = len(coords)
+            index = {p: offset + i for i, p in enumerate(creature.points)}
+            for p in creature.points:
+                coords.append((p.x, p.y))
+                prev.append((p.prev_x, p.prev_y))
+                mass.append(p.mass)
+                radius.append(p.radius)
+                movable.append(not p.fixed)
+                point_owner.append(c)
+                
+            base = len(first)
+            for m in creature.muscles:
+                first.append(index[m.point1])
+                second.append(index[m.point2])
+                rest.append(m.rest_length)
+                strength.append(m.strength)
+                phase.append(m.phase)
+                speed.append(m.speed)
+                muscle_owner.append(c)
+                
+            # Волны разных существ не пересекаются по точкам, их можно сливать
+            own = muscle_waves(first[base:], second[base:])
+            for w, wave in enumerate(own):
+                if w == len(waves):
+                    waves.append([])
+                waves[w].append(wave + base)
+            point_start.append(len(coords))
+            muscle_start.append(len(first))
+        
+        self.pos = np.array(coords, dtype=float).reshape(-1, 2)
+        self.prev = np.array(prev, dtype=float).reshape(-1, 2)
+        self.radius = np.array(radius, dtype=float)
+        self.movable = np.array(movable, dtype=bool)
+        self.inv_mass = self.movable / np.array(mass, dtype=float)
+        self.point_owner = np.array(point_owner, dtype=np.intp)
+        self.point_count = np.bincount(self.point_owner, minlength=n)
+        
+        self.first = np.array(first, dtype=np.intp)
+        self.second = np.array(second, dtype=np.intp)
+        self.rest_length = np.array(rest, dtype=float)
+        self.target_length = self.rest_length.copy()
+        self.strength = np.array(strength, dtype=float)
+        self.phase = np.array(phase, dtype=float)
+        self.speed = np.array(speed, dtype=float)
+        self.contracting = np.zeros(len(first), dtype=bool)
+        self.muscle_owner = np.array(muscle_owner, dtype=np.intp)
+        self.waves = [np.concatenate(w) for w in waves]
+        # Сколько мышц у точки: по нему усредняются поправки Якоби в pbd_step
+        degree = np.bincount(self.first, minlength=len(coords)) + np.bincount(self.second, minlength=len(coords))
+        self.degree = np.maximum(degree, 1)
+        self.muscle_start = muscle_start
+        # Номер мышцы внутри своего существа и ключ его потока случайности
+        self.muscle_local = np.arange(len(first), dtype=np.uint64) - np.array(muscle_start[:-1], dtype=np.uint64)[self.muscle_owner]
+        self.noise_key = np.array([brain.seed for brain in self.brains], dtype=np.uint64)
+        self.tick = np.array([brain.tick for brain in self.brains], dtype=np.uint64)
+        
+        # Мозги всех существ одной таблицей: строка — команда, столбец — флаг мышцы.
+        # Команда существа c с номером k лежит в строке command_start[c] + k
+        brains = self.brains
+        self.command_table = np.frombuffer(b"".join(bytes(b.actions) for b in brains), dtype=np.uint8)
+        self.command_table = self.command_table.astype(bool).reshape(-1, ACTIONS_PER_COMMAND)
+        self.command_duration = np.array([d for b in brains for d in b.durations], dtype=float)
+        self.command_count = np.array([b.num_commands for b in brains], dtype=np.intp)
+        self.command_start = np.cumsum(self.command_count) - self.command_count
+        self.current_command = np.array([b.current_command for b in brains], dtype=np.intp)
+        self.command_timer = np.array([b.command_timer for b in brains], dtype=float)
+        self.muscle_flag = (self.muscle_local % ACTIONS_PER_COMMAND).astype(np.intp)  # Столбец таблицы для мышцы
+        
+        self.time_alive = np.zeros(n)
+        self.age = np.zeros(n)
+        self.energy = np.full(n, 100.0)
+        self.center = np.stack([self.segment_sum(self.point_owner, self.pos[:, axis]) / self.point_count
+                                for axis in (0, 1)], axis=1)
+        self.velocity = np.zeros(n)
+        self.distance_traveled = np.zeros(n)
+        self.fitness = np.zeros(n)
+        self.active = np.ones(n, dtype=bool)
+        
+    def segment_sum(self, owner, values):
+        return np.bincount(owner, weights=values, minlength=len(self.creatures))
+        
+    def compact(self, keep):
+        # Оставляет только существ с номерами keep (по возрастанию) вместе со всем
+        # их состоянием: дальше тики стоят пропорционально оставшимся, а не всем
+        keep = np.asarray(keep, dtype=np.intp)
+        remap = np.full(len(self.creatures), -1, dtype=np.intp)
+        remap[keep] = np.arange(len(keep))
+        
+        point_mask = remap[self.point_owner] >= 0
+        muscle_mask = remap[self.muscle_owner] >= 0
+        point_index = np.cumsum(point_mask) - 1
+        muscle_index = np.cumsum(muscle_mask) - 1
+        
+        for name in ('pos', 'prev', 'radius', 'movable', 'inv_mass', 'degree'):
+            setattr(self, name, getattr(self, name)[point_mask])
+        for name in ('rest_length', 'target_length', 'strength', 'phase', 'speed', 'contracting', 'muscle_local',
+                     'muscle_flag'):
+            setattr(self, name, getattr(self, name)[muscle_mask])
+        self.first = point_index[self.first[muscle_mask]]
+        self.second = point_index[self.second[muscle_mask]]
+        self.point_owner = remap[self.point_owner[point_mask]]
+        self.muscle_owner = remap[self.muscle_owner[muscle_mask]]
+        waves = [muscle_index[w[muscle_mask[w]]] for w in self.waves]
+        self.waves = [w for w in waves if len(w)]
+        
+        for name in ('point_count', 'noise_key', 'tick', 'time_alive', 'age', 'energy', 'center',
+                     'velocity', 'distance_traveled', 'fitness', 'active',
+                     'command_start', 'command_count', 'current_command', 'command_timer'):
+            setattr(self, name, getattr(self, name)[keep])
+        counts = np.diff(self.muscle_start)[keep]
+        self.muscle_start = [0] + np.cumsum(counts).tolist()
+        self.point_colors = [color for color, kept in zip(self.point_colors, point_mask.tolist()) if kept]
+        self.creatures = [self.creatures[c] for c in keep.tolist()]
+        self.brains = [self.brains[c] for c in keep.tolist()]
+        
+    def update(self, dt):
+        self.think(dt)
+        self.score(self.move(dt), dt)
+        
+    def think(self, dt):
+        # Brain.decide для всех сразу: состояния мышц — одна выборка из таблицы команд,
+        # срывы — одна пачка случайных чисел
+        active = self.active
+        live_muscle = active[self.muscle_owner]
+        command = self.command_start + np.minimum(self.current_command, self.command_count - 1)
+        counters = (self.tick[self.muscle_owner] << np.uint64(32)) + self.muscle_local
+        flip = noise_array(self.noise_key[self.muscle_owner], counters) < FLIP_CHANCE
+        states = np.where(flip, ~self.contracting, self.command_table[command[self.muscle_owner], self.muscle_flag])
+        self.contracting = np.where(live_muscle, states, self.contracting)
+        self.tick += active.astype(np.uint64)
+        
+        timer = self.command_timer + dt * 60
+        done = active & (timer >= self.command_duration[command])
+        self.command_timer = np.where(done, 0.0, np.where(active, timer, self.command_timer))
+        self.current_command = np.where(done, (command - self.command_start + 1) % self.command_count,
+                                        self.current_command)
+        
+    def move(self, dt):
+        # Точки закончивших существ замораживаются; возвращает длины мышц
+        active = self.active
+        live_muscle = active[self.muscle_owner]
+        live = active[self.point_owner]
+        moving = self.movable & live
+        if self.solver == "pbd":
+            self.target_length = np.where(live_muscle, muscle_targets(self.rest_length, self.phase, self.contracting), self.target_length)
+            self.phase = np.where(live_muscle, self.phase + dt * self.speed, self.phase)
+            self.pos, self.prev, lengths = pbd_step(self.pos, self.prev, self.radius, moving, self.first, self.second,
+                                           self.degree, self.target_length, self.rest_length, self.strength,
+                                           self.inv_mass * live, dt, self.iterations)
+        else:
+            self.pos, self.prev = verlet_step(self.pos, self.prev, self.radius, moving, dt)
+            self.target_length = np.where(live_muscle, muscle_targets(self.rest_length, self.phase, self.contracting), self.target_length)
+            self.phase = np.where(live_muscle, self.phase + dt * self.speed, self.phase)
+            lengths = relax_muscles(self.pos, self.first, self.second, self.waves, self.target_length,
+                                    self.rest_length, self.strength, self.inv_mass * live, moving, dt)
+        return lengths
+        
+    def score(self, lengths, dt):
+        active = self.active
+        self.time_alive = np.where(active, self.time_alive + dt, self.time_alive)
+        self.age = np.where(active, self.age + dt * 0.01, self.age)
+        
+        center_x = self.segment_sum(self.point_owner, self.pos[:, 0]) / self.point_count
+        center_y = self.segment_sum(self.point_owner, self.pos[:, 1]) / self.point_count
+        
+        stretch = np.abs(lengths - self.rest_length)
+        movement_cost = self.segment_sum(self.muscle_owner, stretch) * 0.001
+        energy = self.energy - movement_cost * dt
+        distance, velocity, fitness = fitness_terms(center_x, center_y, self.center[:, 0], self.time_alive, energy, self.age, dt)
+        
+        keep = active[:, None]
+        self.center = np.where(keep, np.stack([center_x, center_y], axis=1), self.center)
+        self.energy = np.where(active, energy, self.energy)
+        self.distance_traveled = np.where(active, distance, self.distance_traveled)
+        self.velocity = np.where(active, velocity, self.velocity)
+        self.fitness = np.where(active, fitness, self.fitness)
+        
+    def step(self, dt=SIM_DT, max_time=MAX_LIFETIME, timings=None):
+        # Один тик; правило окончания то же, что в main(): 10 секунд или кончилась энергия
+        if timings is None:
+            self.update(dt)
+        else:
+            timed_update(self, dt, timings)
+        self.active &= (self.time_alive <= max_time) & (self.energy > 0)
+        return self.active.any()
+        
+    def run(self, dt=SIM_DT, max_time=MAX_LIFETIME, timings=None):
+        while self.active.any():
+            self.step(dt, max_time, timings)
+        return self.fitness
+        
+    def record(self):
+        # Столбцы по всем существам, поля в порядке RECORD_FIELDS; плюс маска живых
+        return (self.time_alive, self.center[:, 0], self.center[:, 1], self.velocity,
+                self.energy, self.distance_traveled, self.fitness), self.active
+        
+    def stream(self, dt=SIM_DT, max_time=MAX_LIFETIME):
+        # Как run(), но отдаёт record() после каждого тика
+        while self.active.any():
+            self.step(dt, max_time)
+            yield self.record()
+        
+    def write_back(self):
+        # Итоги по каждому существу возвращаются в объекты
+        for c, creature in enumerate(self.creatures):
+            creature.time_alive = float(self.time_alive[c])
+            creature.age = float(self.age[c])
+            creature.energy = float(self.energy[c])
+            creature.position = self.center[c].tolist()
+            creature.distance_traveled = float(self.distance_traveled[c])
+            creature.velocity = float(self.velocity[c])
+            brain = creature.brain
+            brain.tick = int(self.tick[c])
+            brain.current_command = int(self.current_command[c])
+            brain.command_timer = float(self.command_timer[c])
+            creature.fitness = float(self.fitness[c])
+
+def timed_update(body, dt, timings):
+    # update() по фазам с замером каждой; timings — словарь Telemetry.timings.
+    # Годится для Creature, ArrayCreature и PopulationArrays
+    start = time.perf_counter()
+    body.think(dt)
+    thought = time.perf_counter()
+    stretch = body.move(dt)
+    moved = time.perf_counter()
+    center_x = body.score(stretch, dt)
+    timings['brain'] += thought - start
+    timings['physics'] += moved - thought
+    timings['fitness'] += time.perf_counter() - moved
+    return center_x
+
+def simulate(creature, dt=SIM_DT, max_time=MAX_LIFETIME, vectorized=False, timings=None):
+    # Прогон без отрисовки по тому же правилу, что и в main().
+    # С timings время тика раскладывается по фазам (см. Telemetry)
+    creature.reset()
+    body = ArrayCreature(creature) if vectorized else creature
+    if timings is None:
+        while body.time_alive <= max_time and body.energy > 0:
+            body.update(dt)
+    else:
+        while body.time_alive <= max_time and body.energy > 0:
+            timed_update(body, dt, timings)
+    if vectorized:
+        body.write_back()
+    creature.restore_body()
+    return creature.fitness
+
+def stream(body, dt=SIM_DT, max_time=MAX_LIFETIME):
+    # Поток записей по тикам для Creature или ArrayCreature: по нему можно
+    # остановить оценку раньше, не дожидаясь конца жизни существа
+    while body.time_alive <= max_time and body.energy > 0:
+        body.update(dt)
+        yield body.record()
+
+def evaluate_genome(task):
+    # Выполняется в процессе-работнике (или на месте при workers=1)
+    genome, seed, dt, max_time, vectorized = task
+    creature = genome.build(seed)
+    fitness = simulate(creature, dt, max_time, vectorized)
+    return fitness, creature.distance_traveled, creature.brain.tick
+
+def evaluate_batch(task):
+    # Кусок поколения одной пачкой в процессе-работнике
+    genomes, seeds, dt, max_time, solver = task
+    creatures = [genome.build(seed) for genome, seed in zip(genomes, seeds)]
+    simulate_population(creatures, dt, max_time, solver)
+    return [(c.fitness, c.distance_traveled, c.brain.tick) for c in creatures]
+
+def simulate_population(creatures, dt=SIM_DT, max_time=MAX_LIFETIME, solver="verlet", timings=None):
+    # Всё поколение за один проход по общим массивам
+    for creature in creatures:
+        creature.reset()
+    batch = PopulationArrays(creatures, solver)
+    batch.run(dt, max_time, timings)
+    batch.write_back()
+    for creature in creatures:
+        creature.restore_body()
+    return batch.fitness.tolist()
+
+def random_commands(rng):
+    # Случайная программа мозга: список (действия мышц, длительность)
+    commands = []
+    for _ in range(15):
+        pattern = rng.choice(COMMAND_PATTERNS)
+        repeats = rng.randint(2, 5)
+        
+        for _ in range(repeats):
+            actions = [rng.random() < 0.7 or p for p in pattern]
+            commands.append((actions, rng.randint(8, 25)))
+    return commands
+
+class Genome:
+    # Наследуемая часть существа без живых объектов и состояния отрисовки:
+    # координаты точек, пары индексов мышц и таблица команд мозга в плоских массивах.
+    # Существо собирается из генома только когда его нужно симулировать или показать
+    __slots__ = (
+        'xs', 'ys', 'fixed',
+        'first', 'second', 'strength', 'phase', 'speed', 'edges',
+        'actions', 'durations',
+        'fitness', 'distance_traveled', 'horizon'
+    )
+    
+    def __init__(self):
+        self.xs = array('d')
+        self.ys = array('d')
+        self.fixed = bytearray()
+        self.first = array('i')
+        self.second = array('i')
+        self.strength = array('d')  # Множитель MUSCLE_STRENGTH
+        self.phase = array('d')
+        self.speed = array('d')
+        self.edges = set()  # Пары (меньший, больший индекс) для проверки дублей за O(1)
+        self.actions = bytearray()  # ACTIONS_PER_COMMAND флагов на команду
+        self.durations = array('i')
+        self.fitness = 0
+        self.distance_traveled = 0
+        self.horizon = 0  # Сколько секунд жизни стоит за fitness
+        
+    def __getstate__(self):
+        # Множество рёбер восстанавливается из first/second и не сохраняется
+        return tuple(getattr(self, name) for name in self.__slots__ if name != 'edges')
+        
+    def __setstate__(self, state):
+        names = [name for name in self.__slots__ if name != 'edges']
+        self.horizon = 0  # В старых сохранениях его нет
+        for name, value in zip(names, state):
+            setattr(self, name, value)
+        self.edges = {(min(a, b), max(a, b)) for a, b in zip(self.first, self.second)}
+        
+    @property
+    def num_points(self):
+        return len(self.xs)
+        
+    @property
+    def num_muscles(self):
+        return len(self.first)
+        
+    @property
+    def num_commands(self):
+        return len(self.durations)
+        
+    def add_point(self, x, y, fixed=False):
+        self.xs.append(x)
+        self.ys.append(y)
+        self.fixed.append(fixed)
+        return len(self.xs) - 1
+        
+    def add_muscle(self, a, b, strength=1.0, phase=None, speed=None, rng=None):
+        # Возвращает False, если такая мышца уже есть. Без phase/speed они берутся из rng
+        edge = (a, b) if a < b else (b, a)
+        if edge in self.edges:
+            return False
+        self.edges.add(edge)
+        self.first.append(a)
+        self.second.append(b)
+        self.strength.append(strength)
+        self.phase.append(rng.random() * 2 * math.pi if phase is None else phase)
+        self.speed.append(rng.uniform(0.5, 1.5) if speed is None else speed)
+        return True
+        
+    def add_commands(self, commands):
+        for actions, duration in commands:
+            self.actions.extend(bool(a) for a in actions)
+            self.durations.append(duration)
+            
+    def remove_muscle(self, k):
+        self.edges.discard((min(self.first[k], self.second[k]), max(self.first[k], self.second[k])))
+        for column in (self.first, self.second, self.strength, self.phase, self.speed):
+            del column[k]
+            
+    def remove_point(self, index):
+        # Вместе с точкой уходят её мышцы, остальные индексы сдвигаются
+        for k in reversed(range(self.num_muscles)):
+            if self.first[k] == index or self.second[k] == index:
+                self.remove_muscle(k)
+        del self.xs[index]
+        del self.ys[index]
+        del self.fixed[index]
+        self.first = array('i', (a - (a > index) for a in self.first))
+        self.second = array('i', (b - (b > index) for b in self.second))
+        self.edges = {(min(a, b), max(a, b)) for a, b in zip(self.first, self.second)}
+        
+    def copy(self):
+        clone = Genome()
+        clone.__setstate__(self.__getstate__())
+        for name in ('xs', 'ys', 'first', 'second', 'strength', 'phase', 'speed', 'durations'):
+            setattr(clone, name, array(getattr(self, name).typecode, getattr(self, name)))
+        clone.fixed = bytearray(self.fixed)
+        clone.actions = bytearray(self.actions)
+        return clone
+        
+    @classmethod
+    def create(cls, rng):
+        genome = cls()
+        num_points = rng.randint(4, 8)
+        genome.add_point(WIDTH//2, HEIGHT//2, True)
+        
+        for i in range(1, num_points):
+            angle = rng.random() * 2 * math.pi
+            dist = rng.randint(30, 100) * SCALE
+            genome.add_point(WIDTH//2 + math.cos(angle) * dist, HEIGHT//2 + math.sin(angle) * dist)
+        
+        num_muscles = rng.randint(num_points, num_points * 2)
+        for _ in range(num_muscles):
+            a, b = rng.sample(range(num_points), 2)
+            dist = math.sqrt((genome.xs[b] - genome.xs[a])**2 + (genome.ys[b] - genome.ys[a])**2)
+            if dist < 200 * SCALE:
+                genome.add_muscle(a, b, rng.uniform(0.7, 1.3), rng=rng)
+        
+        genome.add_commands(random_commands(rng))
+        return genome
+        
+    @classmethod
+    def from_creature(cls, creature):
+        # Геном существа в его исходной позе
+        if creature.initial_state is None:
+            creature.restore_body()
+        positions, phases = creature.initial_state
+        genome = cls()
+        index = {}
+        for point, (x, y) in zip(creature.points, positions):
+            index[point] = genome.add_point(x, y, point.fixed)
+        for muscle, phase in zip(creature.muscles, phases):
+            genome.add_muscle(index[muscle.point1], index[muscle.point2],
+                              muscle.base_strength / MUSCLE_STRENGTH, phase, muscle.speed)
+        brain = creature.brain
+        n = ACTIONS_PER_COMMAND
+        genome.add_commands((brain.actions[k*n:(k+1)*n], d) for k, d in enumerate(brain.durations))
+        return genome
+        
+    def digest(self):
+        # Хеш содержимого без фитнеса: одинаковые геномы дают одинаковый digest
+        h = hashlib.blake2b(digest_size=16)
+        for name in ('xs', 'ys', 'fixed', 'first', 'second', 'strength', 'phase', 'speed', 'actions', 'durations'):
+            column = getattr(self, name)
+            h.update(len(column).to_bytes(4, 'little'))
+            h.update(bytes(column))
+        return h.digest()
+        
+    def build(self, seed=None):
+        # Живое существо для симуляции и отрисовки; seed задаёт его поток случайности
+        points = [
+            Point(x, y, bool(fixed), POINT_COLORS[i % len(POINT_COLORS)])
+            for i, (x, y, fixed) in enumerate(zip(self.xs, self.ys, self.fixed))
+        ]
+        muscles = [
+            Muscle(points[a], points[b], strength, phase, speed)
+            for a, b, strength, phase, speed in zip(self.first, self.second, self.strength, self.phase, self.speed)
+        ]
+        n = ACTIONS_PER_COMMAND
+        commands = [(self.actions[k*n:(k+1)*n], duration) for k, duration in enumerate(self.durations)]
+        return Creature(points, muscles, commands, seed)
+        
+    @staticmethod
+    def crossover(parent1, parent2, rng):
+        # Ребёнок получает точки обоих родителей и часть их мышц; мозг у него новый
+        child = Genome()
+        parents = [parent1] if parent1 is parent2 else [parent1, parent2]
+        offsets = []
+        for parent in parents:
+            offsets.append(child.num_points)
+            child.xs.extend(parent.xs)
+            child.ys.extend(parent.ys)
+            child.fixed.extend(parent.fixed)
+        
+        for parent, offset in ((parent1, offsets[0]), (parent2, offsets[-1])):
+            for a, b, strength in zip(parent.first, parent.second, parent.strength):
+                if rng.random() < 0.6:  # Вероятность наследования мышцы
+                    child.add_muscle(a + offset, b + offset, strength, rng=rng)
+        
+        child.add_commands(random_commands(rng))
+        return child
+        
+    def mutate_brain(self, rng):
+        n = ACTIONS_PER_COMMAND
+        for k in range(self.num_commands):
+            if rng.random() < 0.1:
+                self.actions[k*n + rng.randint(0, n-1)] ^= 1
+                
+            if rng.random() < 0.05:
+                self.durations[k] = max(5, self.durations[k] + rng.randint(-3, 3))
+        
+        if rng.random() < 0.2:
+            self.add_commands(random_commands(rng))
+            
+    def mutate(self, rng):
+        self.mutate_brain(rng)
+        
+        if rng.random() < 0.3:
+            if rng.random() < 0.5 and self.num_points < 10:
+                # Добавляем новую точку и соединяем с существующими
+                angle = rng.random() * 2 * math.pi
+                dist = rng.randint(30, 100) * SCALE
+                new = self.add_point(WIDTH//2 + math.cos(angle) * dist, HEIGHT//2 + math.sin(angle) * dist)
+                num_connections = rng.randint(1, 3)
+                for other in rng.sample(range(new), min(num_connections, new)):
+                    self.add_muscle(new, other, rng=rng)
+                    
+            elif self.num_points > 3:
+                # Удаляем случайную точку (не фиксированную)
+                non_fixed = [i for i, fixed in enumerate(self.fixed) if not fixed]
+                if non_fixed:
+                    self.remove_point(rng.choice(non_fixed))
+        
+        if rng.random() < 0.4:
+            if rng.random() < 0.7 and self.num_muscles:
+                # Удаляем случайную мышцу
+                self.remove_muscle(rng.randint(0, self.num_muscles-1))
+            
+            if rng.random() < 0.7 and self.num_points >= 2:
+                # Добавляем новую мышцу, если такой ещё нет
+                a, b = rng.sample(range(self.num_points), 2)
+                dist = math.sqrt((self.xs[b] - self.xs[a])**2 + (self.ys[b] - self.ys[a])**2)
+                if 0 < dist < 250 * SCALE:
+                    self.add_muscle(a, b, rng=rng)
+        
+        # Мутация параметров мышц
+        for k in range(self.num_muscles):
+            if rng.random() < 0.2:
+                self.strength[k] *= rng.uniform(0.8, 1.2)
+            if rng.random() < 0.1:
+                self.speed[k] *= rng.uniform(0.7, 1.3)
+
+class FitnessCache:
+    # LRU-кеш фитнеса по (геном, seed оценки, шаг, горизонт) со счётчиками попаданий.
+    # С path результаты дописываются в файл и подхватываются при перезапуске
+    def __init__(self, max_size=100000, path=None):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.path = path
+        self.file = None
+        if path:
+            self.load()
+            self.file = open(path, "a")
+            
+    @staticmethod
+    def key(genome, seed, dt, max_time, solver="verlet"):
+        h = hashlib.blake2b(genome.digest(), digest_size=16)
+        h.update(f"{seed}:{dt!r}:{max_time!r}:{CONFIG.key()}:{solver}:{FITNESS_VERSION}".encode())
+        return h.hexdigest()
+        
+    def load(self):
+        try:
+            with open(self.path) as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return
+        for line in lines:
+            # Прерванная дозапись оставляет строку без \n, и число в ней может
+            # оказаться обрезанным, но читаемым: такой строке не верим
+            parts = line.split()
+            if not line.endswith("\n") or len(parts) != 3 or len(parts[0]) != 32:
+                continue
+            try:
+                value = (float(parts[1]), float(parts[2]))
+            except ValueError:
+                continue
+            self.store(parts[0], value)
+        if len(lines) > len(self.entries):
+            # Выкидываем из файла дубли, вытесненные и битые записи; после
+            # переписывания новая запись не приклеится к обрывку
+            with open(self.path, "w") as f:
+                for key, (fitness, distance) in self.entries.items():
+                    f.write(f"{key} {fitness!r} {distance!r}\n")
+                    
+    def store(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+        
+    def put(self, key, fitness, distance):
+        self.store(key, (fitness, distance))
+        if self.file:
+            self.file.write(f"{key} {fitness!r} {distance!r}\n")
+            
+    def flush(self):
+        if self.file:
+            self.file.flush()
+            
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+            
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+def solver_of(engine):
+    return "pbd" if engine == "pbd" else "verlet"
+
+def rank_key(genome):
+    # Сначала те, кого оценили дольше: недожившие до конца гонки идут после финалистов
+    return genome.horizon, genome.fitness
+
+class Halving:
+    # Расписание successive halving для Evolution.evaluate: все существа живут first
+    # секунд, после каждой ступени остаётся доля keep лучших, а горизонт растёт
+    # в 1/keep раз до max_time. Безнадёжные отсеиваются за первые секунды
+    def __init__(self, first=MAX_LIFETIME / 8, keep=0.5, min_survivors=2):
+        self.first = first
+        self.keep = keep
+        self.min_survivors = min_survivors
+        
+    def horizons(self, max_time):
+        horizons = []
+        horizon = min(self.first, max_time)
+        while horizon < max_time:
+            horizons.append(horizon)
+            horizon /= self.keep
+        horizons.append(max_time)
+        return horizons
+        
+    def survivors(self, count):
+        return min(count, max(self.min_survivors, math.ceil(count * self.keep)))
+
+class JsonlSink:
+    # Запись на строку; flush после каждой, чтобы за файлом можно было следить (tail -f)
+    def __init__(self, path):
+        self.file = open(path, "a")
+        
+    def write(self, record):
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+        
+    def close(self):
+        self.file.close()
+
+class CsvSink:
+    # Столбцы фиксированы (TELEMETRY_FIELDS); заголовок пишется только в пустой файл
+    def __init__(self, path):
+        self.file = open(path, "a", newline="")
+        self.writer = csv.DictWriter(self.file, TELEMETRY_FIELDS, extrasaction="ignore")
+        if self.file.tell() == 0:
+            self.writer.writeheader()
+            
+    def write(self, record):
+        self.writer.writerow(record)
+        self.file.flush()
+        
+    def close(self):
+        self.file.close()
+
+def open_sink(path):
+    if path.lower().endswith(".csv"):
+        return CsvSink(path)
+    return JsonlSink(path)
+
+class Telemetry:
+    # Сводка по каждому поколению: фитнес, сложность геномов, кеш и время по фазам.
+    # Evolution.evaluate и evolve() заполняют запись, evolve() отдаёт её во все sinks.
+    # Фазы тика меряются только если Evolution.telemetry задан — иначе циклы без замеров
+    def __init__(self, sinks=()):
+        self.sinks = list(sinks)
+        self.timings = dict.fromkeys(TELEMETRY_PHASES, 0.0)
+        self.pending = {}
+        self.hits = 0
+        self.misses = 0
+        self.started = time.time()
+        
+    def evaluated(self, evolution, count, ticks, elapsed):
+        population = evolution.population
+        fitness = [g.fitness for g in population]
+        points = [g.num_points for g in population]
+        muscles = [g.num_muscles for g in population]
+        cache = evolution.cache
+        hit_rate = None
+        if cache is not None:
+            # Доля попаданий именно в этом поколении, а не за весь запуск
+            hits, misses = cache.hits - self.hits, cache.misses - self.misses
+            self.hits, self.misses = cache.hits, cache.misses
+            hit_rate = hits / (hits + misses) if hits + misses else 0.0
+        self.pending.update({
+            "population": len(population),
+            "evaluated": count,
+            "ticks": ticks,
+            "eval_sec": elapsed,
+            "ticks_per_sec": ticks / elapsed if elapsed > 0 else 0.0,
+            "best_fitness": max(population, key=rank_key).fitness,
+            "mean_fitness": statistics.fmean(fitness),
+            "median_fitness": statistics.median(fitness),
+            "points_mean": statistics.fmean(points),
+            "points_max": max(points),
+            "muscles_mean": statistics.fmean(muscles),
+            "muscles_max": max(muscles),
+            "commands_mean": statistics.fmean(g.num_commands for g in population),
+            "cache_hit_rate": hit_rate,
+        })
+        
+    def evolved(self, evolution, elapsed):
+        self.timings['crossover'] += elapsed
+        record = {
+            "generation": evolution.generation,
+            "time": time.time() - self.started,
+            "record": evolution.best_fitness,
+        }
+        record.update(self.pending)
+        for phase in TELEMETRY_PHASES:
+            record[f"{phase}_sec"] = self.timings[phase]
+            self.timings[phase] = 0.0
+        self.pending = {}
+        for sink in self.sinks:
+            sink.write(record)
+            
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+class Evolution:
+    def __init__(self, population_size=8, seed=None, cache=None, telemetry=None):
+        self.population_size = population_size
+        # Вся случайность эволюции идёт от одного seed'а: он воспроизводит запуск целиком
+        self.seed = random.getrandbits(64) if seed is None else seed
+        self.rng = random.Random(self.seed)
+        self.population = []  # Геномы; существа собираются из них при оценке
+        self.generation = 0
+        self.best_fitness = 0
+        self.best_genome = None
+        self.cache = cache  # FitnessCache или None
+        self.telemetry = telemetry  # Telemetry или None
+        self.recorder = None  # ReplayRecorder или None
+        self.pool = None
+        self.pool_size = 0
+        self.initialize_population()
+        
+    def initialize_population(self):
+        for _ in range(self.population_size):
+            self.population.append(Genome.create(self.rng))
+    
+    def evaluate(self, dt=SIM_DT, max_time=MAX_LIFETIME, engine="objects", workers=None, schedule=None):
+        # Оцениваем всё поколение, а не только показанное существо.
+        # engine: "objects" — Point/Muscle, "arrays" — ArrayCreature по одному,
+        # "batch" — всё поколение разом в PopulationArrays, "pbd" — так же, но решателем
+        # на ограничениях с землёй (другая физика: свой фитнес, обычно с dt=PBD_DT).
+        # workers: число процессов. У каждого существа свой seed (evaluation_seed),
+        # поэтому objects, arrays и batch при любом workers дают один и тот же фитнес.
+        # С кешем симулируются только геномы, которых в нём ещё нет, по одному на дубль.
+        # schedule (Halving) оценивает их гонкой: до max_time доживают только лучшие,
+        # у остальных fitness за меньший horizon, и в рейтинге они идут после
+        started = time.perf_counter()
+        timings = self.telemetry.timings if self.telemetry is not None else None
+        pending = OrderedDict()
+        for genome in self.population:
+            seed = self.evaluation_seed(genome)
+            if self.cache is None:
+                pending[id(genome)] = (seed, [genome])
+                continue
+            
+            key = FitnessCache.key(genome, seed, dt, max_time, solver_of(engine))
+            cached = self.cache.get(key)
+            if cached is not None:
+                genome.fitness, genome.distance_traveled = cached
+                genome.horizon = max_time
+            elif key in pending:
+                pending[key][1].append(genome)
+            else:
+                pending[key] = (seed, [genome])
+        
+        genomes = [group[0] for _, group in pending.values()]
+        seeds = [seed for seed, _ in pending.values()]
+        if schedule is None:
+            ticks = self.simulate_genomes(genomes, seeds, dt, max_time, engine, workers, timings)
+            for genome in genomes:
+                genome.horizon = max_time
+        else:
+            ticks = self.race(genomes, seeds, dt, schedule.horizons(max_time), schedule, engine, workers, timings)
+        
+        for key, (seed, group) in pending.items():
+            for twin in group[1:]:
+                twin.fitness = group[0].fitness
+                twin.distance_traveled = group[0].distance_traveled
+                twin.horizon = group[0].horizon
+            # Кешируется только полный результат
+            if self.cache is not None and group[0].horizon == max_time:
+                self.cache.put(key, group[0].fitness, group[0].distance_traveled)
+        if self.cache is not None:
+            self.cache.flush()
+            
+        ranking = sorted(self.population, key=rank_key, reverse=True)
+        if self.telemetry is not None:
+            self.telemetry.evaluated(self, len(genomes), ticks, time.perf_counter() - started)
+        if self.recorder is not None:
+            # Номер поколения — как его покажут после evolve()
+            champion = ranking[0]
+            self.recorder.submit(self.generation + 1, champion, self.evaluation_seed(champion),
+                                 dt, max_time, solver_of(engine), self.pool)
+        return [(g.fitness, g) for g in ranking]
+    
+    def simulate_genomes(self, genomes, seeds, dt, max_time, engine, workers, timings=None):
+        # Возвращает число просчитанных тиков; фазы (timings) меряются только в этом процессе
+        if workers:
+            return self.evaluate_parallel(genomes, seeds, dt, max_time, engine, workers)
+        if engine in ("batch", "pbd"):
+            creatures = [genome.build(seed) for genome, seed in zip(genomes, seeds)]
+            simulate_population(creatures, dt, max_time, solver_of(engine), timings)
+            for genome, creature in zip(genomes, creatures):
+                genome.fitness = creature.fitness
+                genome.distance_traveled = creature.distance_traveled
+            return sum(creature.brain.tick for creature in creatures)
+        ticks = 0
+        for genome, seed in zip(genomes, seeds):
+            creature = genome.build(seed)
+            genome.fitness = simulate(creature, dt, max_time, engine == "arrays", timings)
+            genome.distance_traveled = creature.distance_traveled
+            ticks += creature.brain.tick
+        return ticks
+    
+    def race(self, genomes, seeds, dt, horizons, schedule, engine, workers, timings=None):
+        # Successive halving. В одном процессе выжившие продолжают с того места,
+        # где остановились; с workers каждая ступень считается в процессах заново
+        # с начала (существа не переезжают между процессами), результат тот же
+        alive = list(range(len(genomes)))
+        rows = list(alive)  # Номера геномов по строкам batch
+        ticks = [0] * len(genomes)
+        if workers:
+            bodies = None
+        elif engine in ("batch", "pbd"):
+            creatures = [genome.build(seed) for genome, seed in zip(genomes, seeds)]
+            for creature in creatures:
+                creature.reset()
+            batch = PopulationArrays(creatures, solver_of(engine))
+        else:
+            bodies = []
+            for genome, seed in zip(genomes, seeds):
+                creature = genome.build(seed)
+                creature.reset()
+                bodies.append(ArrayCreature(creature) if engine == "arrays" else creature)
+        
+        for rung, horizon in enumerate(horizons):
+            if workers:
+                # Ступень считается с начала, поэтому её тики прибавляются целиком
+                ticks[0] += self.evaluate_parallel([genomes[i] for i in alive], [seeds[i] for i in alive],
+                                                   dt, horizon, engine, workers)
+            elif engine in ("batch", "pbd"):
+                # Отсеянных выбрасываем из массивов; правило окончания то же, что в step()
+                if len(rows) != len(alive):
+                    batch.compact([rows.index(i) for i in alive])
+                    rows = list(alive)
+                batch.active = (batch.time_alive <= horizon) & (batch.energy > 0)
+                batch.run(dt, horizon, timings)
+                for row, i in enumerate(rows):
+                    genomes[i].fitness = float(batch.fitness[row])
+                    genomes[i].distance_traveled = float(batch.distance_traveled[row])
+                    ticks[i] = int(batch.tick[row])
+            else:
+                for i in alive:
+                    body = bodies[i]
+                    if timings is None:
+                        while body.time_alive <= horizon and body.energy > 0:
+                            body.update(dt)
+                    else:
+                        while body.time_alive <= horizon and body.energy > 0:
+                            timed_update(body, dt, timings)
+                    genomes[i].fitness = body.fitness
+                    genomes[i].distance_traveled = body.distance_traveled
+                    ticks[i] = body.brain.tick
+            for i in alive:
+                genomes[i].horizon = horizon
+            
+            if rung + 1 < len(horizons):
+                alive.sort(key=lambda i: genomes[i].fitness, reverse=True)
+                alive = sorted(alive[:schedule.survivors(len(alive))])
+        return sum(ticks)
+        
+    def evaluation_seed(self, genome):
+        # Зависит только от seed'а запуска и содержимого генома: одинаковые геномы
+        # получают одинаковый фитнес, и его можно кешировать по (геном, seed)
+        key = (self.seed & MASK64).to_bytes(8, 'little')
+        digest = hashlib.blake2b(genome.digest(), digest_size=8, key=key).digest()
+        return int.from_bytes(digest, 'little')
+    
+    def evaluate_parallel(self, population, seeds, dt, max_time, engine, workers):
+        if not population:
+            return 0
+        if engine in ("batch", "pbd"):
+            # Каждый процесс получает свой кусок поколения и считает его пачкой
+            size = -(-len(population) // workers)
+            tasks = [
+                (population[i:i+size], seeds[i:i+size], dt, max_time, solver_of(engine))
+                for i in range(0, len(population), size)
+            ]
+            function = evaluate_batch
+        else:
+            tasks = [
+                (genome, seed, dt, max_time, engine == "arrays")
+                for genome, seed in zip(population, seeds)
+            ]
+            function = evaluate_genome
+        
+        if workers == 1:
+            results = list(map(function, tasks))
+        else:
+            if self.pool is None or self.pool_size != workers:
+                self.close()
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context("fork" if "fork" in methods else None)
+                self.pool = context.Pool(workers)
+                self.pool_size = workers
+            chunksize = max(1, len(tasks) // (workers * 4))
+            results = self.pool.map(function, tasks, chunksize)
+        
+        if engine in ("batch", "pbd"):
+            results = [result for chunk in results for result in chunk]
+        for genome, (fitness, distance, _) in zip(population, results):
+            genome.fitness = fitness
+            genome.distance_traveled = distance
+        return sum(ticks for _, _, ticks in results)
+    
+    def close(self):
+        if self.recorder is not None:
+            self.recorder.wait()  # Повторы могут писаться в пуле
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+            self.pool_size = 0
+    
+    def state(self):
+        # Всё, что нужно для продолжения: геномы уже несут свой фитнес
+        return {
+            'version': 1,
+            'population_size': self.population_size,
+            'population': self.population,
+            'generation': self.generation,
+            'best_fitness': self.best_fitness,
+            'best_genome': self.best_genome,
+            'seed': self.seed,
+            'rng_state': self.rng.getstate()
+        }
+    
+    @classmethod
+    def from_state(cls, state, cache=None):
+        evolution = cls.__new__(cls)
+        evolution.population_size = state['population_size']
+        evolution.population = state['population']
+        evolution.generation = state['generation']
+        evolution.best_fitness = state['best_fitness']
+        evolution.best_genome = state['best_genome']
+        evolution.seed = state['seed']
+        evolution.rng = random.Random()
+        evolution.rng.setstate(state['rng_state'])
+        evolution.cache = cache
+        evolution.telemetry = None
+        evolution.recorder = None
+        evolution.pool = None
+        evolution.pool_size = 0
+        return evolution
+    
+    def emigrants(self, count):
+        # Копии лучших для соседнего острова; фитнес едет вместе с ними
+        ranking = sorted(self.population, key=rank_key, reverse=True)
+        migrants = []
+        for genome in ranking[:count]:
+            clone = genome.copy()
+            clone.fitness = genome.fitness
+            clone.distance_traveled = genome.distance_traveled
+            clone.horizon = genome.horizon
+            migrants.append(clone)
+        return migrants
+        
+    def immigrate(self, migrants):
+        # Приезжие занимают места худших; вызывать между evaluate и evolve
+        self.population.sort(key=rank_key, reverse=True)
+        keep = max(0, len(self.population) - len(migrants))
+        self.population[keep:] = migrants[:len(self.population)]
+        
+    def evolve(self):
+        started = time.perf_counter()
+        self.generation += 1
+        
+        # Рекорд ставят только оценённые на полный срок
+        full = max(genome.horizon for genome in self.population)
+        for genome in self.population:
+            if genome.horizon == full and (self.best_genome is None or genome.fitness > self.best_fitness):
+                self.best_fitness = genome.fitness
+                self.best_genome = genome
+        
+        self.population.sort(key=rank_key, reverse=True)
+        
+        best_genomes = self.population[:int(self.population_size * 0.4)]
+        new_population = []
+        new_population.extend(best_genomes[:2])
+        
+        while len(new_population) < self.population_size:
+            parent1 = self.rng.choice(best_genomes)
+            parent2 = self.rng.choice(best_genomes)
+            child = Genome.crossover(parent1, parent2, self.rng)
+            
+            if self.rng.random() < 0.8:
+                child.mutate(self.rng)
+            
+            new_population.append(child)
+        
+        self.population = new_population
+        if self.telemetry is not None:
+            self.telemetry.evolved(self, time.perf_counter() - started)
+        return self.best_genome
+
+class Checkpoint:
+    # Сохраняет эволюцию каждые every поколений. Снимок (pickle геномов) делается сразу,
+    # а сжатие и запись идут в фоновом потоке. Файл заменяется атомарно,
+    # так что убитый системой процесс оставляет последнее целое сохранение
+    def __init__(self, path=CHECKPOINT_PATH, every=CHECKPOINT_EVERY):
+        self.path = path
+        self.every = every
+        self.writer = None
+        
+    def maybe_save(self, evolution):
+        if self.every and evolution.generation % self.every == 0:
+            self.save(evolution)
+            
+    def save(self, evolution):
+        data = pickle.dumps(evolution.state(), pickle.HIGHEST_PROTOCOL)
+        self.wait()
+        self.writer = threading.Thread(target=self.write, args=(data,), daemon=True)
+        self.writer.start()
+        
+    def write(self, data):
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(zlib.compress(data, 6))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        
+    def wait(self):
+        if self.writer is not None:
+            self.writer.join()
+            self.writer = None
+            
+    def load(self, cache=None):
+        # Evolution из сохранения или None, если его нет
+        try:
+            with open(self.path, "rb") as f:
+                state = pickle.loads(zlib.decompress(f.read()))
+        except FileNotFoundError:
+            return None
+        return Evolution.from_state(state, cache)
+        
+    def archive(self):
+        # Перед сбросом откладываем старый прогресс, а не теряем его
+        self.wait()
+        if os.path.exists(self.path):
+            os.replace(self.path, self.path + ".prev")
+
+def replay_dtype(num_points, num_muscles):
+    # Кадр повтора: центр масс, смещения точек от него в долях REPLAY_QUANTUM и флаги мышц
+    return np.dtype([
+        ('center', np.float32, (2,)),
+        ('offset', np.int16, (num_points, 2)),
+        ('contracting', np.uint8, (num_muscles,)),
+    ])
+
+def replay_path(directory, generation):
+    # Без расширения: рядом лежат .npy с кадрами и .meta с геномом
+    return os.path.join(directory, f"gen_{generation:06d}")
+
+def record_replay(path, genome, seed, dt=SIM_DT, max_time=MAX_LIFETIME, solver="verlet", generation=0):
+    # Симуляция детерминирована по seed'у, поэтому чемпиона можно прогнать ещё раз
+    # и записать каждый тик. Массив кадров выделяется сразу и пишется через memmap;
+    # .meta появляется последним, так что недописанный повтор никто не откроет
+    batch = PopulationArrays([genome.build(seed)], solver)
+    rows = int(max_time / dt) + 3
+    frames = np.lib.format.open_memmap(path + ".tmp", mode="w+", shape=(rows,),
+                                       dtype=replay_dtype(len(batch.pos), len(batch.contracting)))
+    ticks = 0
+    running = True
+    while ticks < rows:
+        # Кадр 0 — начальная поза, последний — поза после последнего тика
+        frame = frames[ticks]
+        center = batch.pos.mean(axis=0).astype(np.float32)
+        frame['center'] = center
+        frame['offset'] = np.clip(np.rint((batch.pos - center) / REPLAY_QUANTUM), -32767, 32767)
+        frame['contracting'] = batch.contracting
+        ticks += 1
+        if not running:
+            break
+        running = batch.step(dt, max_time)
+    frames.flush()
+    del frames
+    os.replace(path + ".tmp", path + ".npy")
+    
+    meta = {
+        'genome': genome, 'seed': seed, 'dt': dt, 'solver': solver, 'generation': generation,
+        'ticks': ticks, 'fitness': float(batch.fitness[0]),
+        'distance_traveled': float(batch.distance_traveled[0]),
+    }
+    with open(path + ".meta.tmp", "wb") as f:
+        pickle.dump(meta, f, pickle.HIGHEST_PROTOCOL)
+    os.replace(path + ".meta.tmp", path + ".meta")
+    return path
+
+class Replay:
+    # Записанный повтор. Кадры открываются через memmap: любой тик читается сразу,
+    # без пересчёта симуляции и без загрузки файла целиком
+    def __init__(self, path):
+        with open(path + ".meta", "rb") as f:
+            meta = pickle.load(f)
+        self.path = path
+        self.genome = meta['genome']
+        self.seed = meta['seed']
+        self.dt = meta['dt']
+        self.solver = meta['solver']
+        self.generation = meta['generation']
+        self.ticks = meta['ticks']
+        self.fitness = meta['fitness']
+        self.distance_traveled = meta['distance_traveled']
+        self.frames = np.load(path + ".npy", mmap_mode="r")
+        
+    def positions(self, tick):
+        frame = self.frames[min(tick, self.ticks - 1)]
+        return frame['center'].astype(float) + frame['offset'] * REPLAY_QUANTUM, frame['contracting']
+        
+    def creature(self):
+        return self.genome.build(self.seed)
+        
+    def apply(self, creature, tick):
+        # Переносит кадр в существо из creature(): точки, мышцы и их цвета как в Muscle.update
+        pos, contracting = self.positions(tick)
+        for point, (x, y) in zip(creature.points, pos.tolist()):
+            point.x, point.y = x, y
+        for muscle, state in zip(creature.muscles, contracting.tolist()):
+            muscle.contracting = bool(state)
+            if state:
+                muscle.color = GREEN
+            else:
+                length = math.hypot(muscle.point2.x - muscle.point1.x, muscle.point2.y - muscle.point1.y)
+                ratio = length / muscle.rest_length if muscle.rest_length else 1.0
+                muscle.color = ORANGE if ratio > 1.2 else PURPLE if ratio < 0.8 else BLUE
+        creature.position = pos.mean(axis=0).tolist()
+
+class ReplayRecorder:
+    # Пишет чемпиона каждого поколения в directory (Evolution.recorder). Запись идёт
+    # в фоне: в пуле процессов оценки, если он есть, иначе в отдельном потоке
+    def __init__(self, directory=REPLAY_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.tasks = queue.Queue()
+        self.thread = None
+        self.pending = []  # AsyncResult из пула
+        self.error = None
+        
+    def submit(self, generation, genome, seed, dt, max_time, solver="verlet", pool=None):
+        task = (replay_path(self.directory, generation), genome.copy(), seed, dt, max_time, solver, generation)
+        if pool is not None:
+            for result in [result for result in self.pending if result.ready()]:
+                result.get()
+                self.pending.remove(result)
+            self.pending.append(pool.apply_async(record_replay, task))
+            return
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.work, daemon=True)
+            self.thread.start()
+        self.tasks.put(task)
+        
+    def work(self):
+        while True:
+            task = self.tasks.get()
+            try:
+                if task is None:
+                    return
+                record_replay(*task)
+            except Exception as error:
+                self.error = error
+            finally:
+                self.tasks.task_done()
+                
+    def wait(self):
+        # Дожидается всех начатых записей; ошибку фонового потока поднимает здесь
+        for result in self.pending:
+            result.get()
+        self.pending = []
+        if self.thread is not None:
+            self.tasks.join()
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+            
+    def close(self):
+        try:
+            self.wait()
+        finally:
+            if self.thread is not None:
+                self.tasks.put(None)
+                self.thread.join()
+                self.thread = None
+                
+    def generations(self):
+        # Номера поколений с дописанными повторами, по возрастанию
+        found = []
+        for name in os.listdir(self.directory):
+            if name.startswith("gen_") and name.endswith(".meta"):
+                found.append(int(name[4:-5]))
+        return sorted(found)
+        
+    def open(self, generation):
+        return Replay(replay_path(self.directory, generation))
+        
+    def clear(self):
+        self.wait()
+        for name in os.listdir(self.directory):
+            if name.startswith("gen_"):
+                os.remove(os.path.join(self.directory, name))
+
+def island_seed(seed, index):
+    # Свой seed у каждого острова, выведенный из общего seed'а запуска
+    key = (seed & MASK64).to_bytes(8, 'little')
+    digest = hashlib.blake2b(index.to_bytes(4, 'little'), digest_size=8, key=key).digest()
+    return int.from_bytes(digest, 'little')
+
+def ring_sockets(addresses, index, timeout=30):
+    # Кольцо островов через TCP (multiprocessing.connection): слушаем свой адрес
+    # и подключаемся к следующему. Годится и для нескольких машин, и как замена
+    # Pipe на одной. Приём идёт в потоке: Client ждёт, пока сосед нас примет
+    listener = Listener(addresses[index], authkey=ISLAND_AUTHKEY)
+    accepted = []
+    acceptor = threading.Thread(target=lambda: accepted.append(listener.accept()), daemon=True)
+    acceptor.start()
+    target = addresses[(index + 1) % len(addresses)]
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            outbox = Client(target, authkey=ISLAND_AUTHKEY)
+            break
+        except ConnectionRefusedError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+    acceptor.join(timeout)
+    listener.close()
+    if not accepted:
+        raise TimeoutError(f"Остров {index}: сосед не подключился")
+    return accepted[0], outbox
+
+class Island:
+    # Evolution, которая раз в every поколений отдаёт migrants лучших следующему
+    # острову кольца и заменяет своих худших приезжими от предыдущего.
+    # inbox/outbox — концы Pipe или сокеты из ring_sockets: у них одинаковые send/recv
+    def __init__(self, index, evolution, inbox=None, outbox=None, every=MIGRATE_EVERY, migrants=MIGRANTS):
+        self.index = index
+        self.evolution = evolution
+        self.inbox = inbox
+        self.outbox = outbox
+        self.every = every
+        self.migrants = migrants
+        
+    def migrate(self):
+        # Отправка в потоке: если все острова разом пишут в полные буферы, кольцо встаёт
+        sender = threading.Thread(target=self.outbox.send, args=(self.evolution.emigrants(self.migrants),))
+        sender.start()
+        immigrants = self.inbox.recv()
+        sender.join()
+        self.evolution.immigrate(immigrants)
+        
+    def run(self, generations, dt=SIM_DT, engine="objects", schedule=None, report=None):
+        evolution = self.evolution
+        for _ in range(generations):
+            ranking = evolution.evaluate(dt, engine=engine, schedule=schedule)
+            if self.outbox is not None and (evolution.generation + 1) % self.every == 0:
+                self.migrate()
+            evolution.evolve()
+            if report:
+                report((self.index, evolution.generation, ranking[0][0], evolution.best_fitness))
+        return evolution.best_genome
+
+def island_process(index, count, population_size, seed, generations, dt, engine, schedule,
+                   every, migrants, report, inbox=None, outbox=None, addresses=None):
+    # Тело процесса-острова; в конце отчёт с поколением None и лучшим геномом
+    if addresses:
+        inbox, outbox = ring_sockets(addresses, index)
+    evolution = Evolution(population_size, island_seed(seed, index))
+    island = Island(index, evolution, inbox if count > 1 else None, outbox if count > 1 else None,
+                    every, migrants)
+    best = island.run(generations, dt, engine, schedule, report)
+    report((index, None, evolution.best_fitness, best))
+    return best
+
+def evolve_islands(count, generations, population_size=8, seed=None, dt=SIM_DT, engine="objects",
+                   schedule=None, every=MIGRATE_EVERY, migrants=MIGRANTS, addresses=None):
+    # Островная модель: count Evolution в отдельных процессах, обмен по кольцу.
+    # Связь — Pipe, или TCP по addresses (список (host, port) на каждый остров).
+    # Генератор отчётов (остров, поколение, лучший в поколении, рекорд острова);
+    # закончивший остров присылает (остров, None, рекорд, лучший геном)
+    if seed is None:
+        seed = random.getrandbits(64)
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
+    reports = context.Queue()
+    pipes = [context.Pipe(duplex=False) for _ in range(count)] if not addresses else None
+    
+    processes = []
+    for index in range(count):
+        if pipes:
+            channels = {'inbox': pipes[index][0], 'outbox': pipes[(index + 1) % count][1]}
+        else:
+            channels = {'addresses': addresses}
+        process = context.Process(
+            target=island_process,
+            args=(index, count, population_size, seed, generations, dt, engine, schedule,
+                  every, migrants, reports.put),
+            kwargs=channels
+        )
+        process.start()
+        processes.append(process)
+    
+    try:
+        finished = 0
+        while finished < count:
+            try:
+                report = reports.get(timeout=1)
+            except queue.Empty:
+                # Упавший остров не пришлёт отчёт, а его соседи повиснут на обмене
+                for index, process in enumerate(processes):
+                    if process.exitcode not in (None, 0):
+                        raise RuntimeError(f"Остров {index} завершился с кодом {process.exitcode}")
+                continue
+            if report[1] is None:
+                finished += 1
+            yield report
+        for process in processes:
+            process.join()
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()